@@ -1,32 +1,146 @@
 ###app.py
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, make_response, send_file
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, make_response, send_file, g, abort
+from markupsafe import Markup
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.exc import IntegrityError
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+import click
 import pytz
+import gzip
+import hashlib
 import json
+import os
+import time
 from io import BytesIO
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
-
-app = Flask(__name__)
+import numpy as np
+from models import PremiumCalculator, pricing_tables, projection, joint_life, kernels
+from models.jobs import JobQueue
+from models.fragment_cache import FragmentCache
+from models.concurrency import SingleFlight, AdmissionControl, Surcharge
+from models.profiling import Profileur, ProfilRequete
+from models.goal_seek import resoudre_continu, resoudre_discret
+from models.archive import ArchiveCalculs
+
+# Base, archives et résultats dans instance/ ; CALCULATEUR_INSTANCE désigne un
+# autre dossier (banc de charge, tests) pour ne pas toucher à la base réelle
+dossier_instance = os.environ.get('CALCULATEUR_INSTANCE')
+app = Flask(__name__, instance_path=os.path.abspath(dossier_instance) if dossier_instance else None)
 app.config['SECRET_KEY'] = 'votre_cle_secrete_ici'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///calculations.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['HISTORY_CACHE_MAX_ENTRIES'] = 1000
+app.config['HISTORY_CACHE_MAX_SIZE'] = 32 * 1024 * 1024
+# Les calculs plus anciens partent dans l'archive compressée (flask archive)
+app.config['ARCHIVE_AGE_JOURS'] = int(os.environ.get('CALCULATEUR_ARCHIVE_AGE_JOURS', 365))
+# Compression des réponses HTML et JSON au-delà de ce seuil (octets)
+app.config['COMPRESSION_SEUIL'] = 1024
+app.config['COMPRESSION_NIVEAU'] = 6
+# Borne haute du capital pour la recherche inverse (/goal_seek)
+app.config['GOAL_SEEK_CAPITAL_MAX'] = 100_000_000
+# Contrôle d'admission commun à tous les workers (max_global, max_par_utilisateur).
+# Les PDF ont leur propre réserve et n'occupent jamais plus de la moitié des
+# threads d'un worker (CALCULATEUR_THREADS, voir gunicorn.conf.py) : il reste
+# toujours des threads pour les devis
+THREADS_PAR_WORKER = int(os.environ.get('CALCULATEUR_THREADS', 4))
+app.config['ADMISSION_CALCUL'] = {'max_global': 32, 'max_par_utilisateur': 4,
+                                  'max_processus': THREADS_PAR_WORKER, 'attente_max': 2.0}
+app.config['ADMISSION_PDF'] = {'max_global': 2, 'max_par_utilisateur': 1,
+                               'max_processus': max(1, THREADS_PAR_WORKER // 2), 'attente_max': 5.0}
 
 db = SQLAlchemy(app)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Noyaux des boucles actuarielles : 'python' (par défaut) ou 'numba' si installé
+kernels.selectionner_backend(os.environ.get('CALCULATEUR_KERNELS', 'python'))
+
+# File de tâches longues (table jobs dans la même base que les calculs)
+os.makedirs(app.instance_path, exist_ok=True)
+job_queue = JobQueue(os.path.join(app.instance_path, 'calculations.db'),
+                     os.path.join(app.instance_path, 'jobs'))
+
+# Archive des anciens calculs : fichiers mensuels compressés, index dans la base
+archive_calculs = ArchiveCalculs(os.path.join(app.instance_path, 'calculations.db'),
+                                 os.path.join(app.instance_path, 'archives'))
+
+# Fragments de l'historique rendus, par utilisateur et version de son historique
+history_cache = FragmentCache(app.config['HISTORY_CACHE_MAX_ENTRIES'], app.config['HISTORY_CACHE_MAX_SIZE'])
+# Les ETag changent à chaque démarrage, au cas où les gabarits auraient changé
+HISTORY_ETAG_PREFIX = f'historique-{int(time.time())}'
+
+# Regroupement des requêtes identiques et limites de concurrence
+coalesceur = SingleFlight()
+dossier_admission = os.path.join(app.instance_path, 'admission')
+calcul_admission = AdmissionControl('calcul', dossier_admission, **app.config['ADMISSION_CALCUL'])
+pdf_admission = AdmissionControl('pdf', dossier_admission, **app.config['ADMISSION_PDF'])
+
+# Empreintes des fichiers statiques, calculées une fois au démarrage :
+# url_for('static', ...) y ajoute ?v=<empreinte>, servie avec un cache immuable
+def empreintes_statiques(dossier):
+    empreintes = {}
+    for racine, _, fichiers in os.walk(dossier):
+        for nom in fichiers:
+            chemin = os.path.join(racine, nom)
+            with open(chemin, 'rb') as fichier:
+                empreinte = hashlib.sha256(fichier.read()).hexdigest()[:12]
+            empreintes[os.path.relpath(chemin, dossier).replace(os.sep, '/')] = empreinte
+    return empreintes
+
+EMPREINTES_STATIQUES = empreintes_statiques(app.static_folder)
+
+@app.url_defaults
+def ajouter_empreinte_statique(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        empreinte = EMPREINTES_STATIQUES.get(values['filename'])
+        if empreinte:
+            values['v'] = empreinte
+
+TYPES_COMPRESSES = ('text/html', 'application/json')
+
+@app.after_request
+def compresser_reponse(response):
+    if request.endpoint == 'static':
+        if request.args.get('v') == EMPREINTES_STATIQUES.get(request.view_args.get('filename')):
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    if (response.mimetype not in TYPES_COMPRESSES or response.direct_passthrough
+            or response.status_code != 200 or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    if 'gzip' not in request.accept_encodings:
+        return response
+    donnees = response.get_data()
+    if len(donnees) < app.config['COMPRESSION_SEUIL']:
+        return response
+
+    response.set_data(gzip.compress(donnees, compresslevel=app.config['COMPRESSION_NIVEAU']))
+    response.headers['Content-Encoding'] = 'gzip'
+    # Le corps compressé n'est plus identique octet pour octet : ETag faible
+    etag, faible = response.get_etag()
+    if etag and not faible:
+        response.set_etag(etag, weak=True)
+    return response
+
+def precharger_gabarits():
+    """Compile tous les gabarits Jinja une fois (dans le maître, avant le fork)"""
+    for nom in app.jinja_env.list_templates():
+        app.jinja_env.get_template(nom)
+    return len(app.jinja_env.list_templates())
+
 # Modèles de données
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     password_hash = db.Column(db.String(120), nullable=False)
+    history_version = db.Column(db.Integer, nullable=False, default=0)
     calculations = db.relationship('Calculation', backref='user', lazy=True)
 
 class Calculation(db.Model):
@@ -36,11 +150,36 @@ class Calculation(db.Model):
     parameters = db.Column(db.Text, nullable=False)
     date = db.Column(db.DateTime, nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    tariff_version = db.Column(db.String(20), index=True)
+
+class TariffVersion(db.Model):
+    version = db.Column(db.String(20), primary_key=True)
+    empreintes = db.Column(db.Text, nullable=False)
+    date = db.Column(db.DateTime, nullable=False)
+
+class RepricingRun(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    tariff_version = db.Column(db.String(20), unique=True, nullable=False)
+    dernier_id = db.Column(db.Integer, nullable=False, default=0)
+    recalcules = db.Column(db.Integer, nullable=False, default=0)
+    inchanges = db.Column(db.Integer, nullable=False, default=0)
+    erreurs = db.Column(db.Integer, nullable=False, default=0)
+    statut = db.Column(db.String(20), nullable=False, default='en_cours')
+    date_debut = db.Column(db.DateTime, nullable=False)
+    date_fin = db.Column(db.DateTime)
 
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
+def invalidate_history(user_ids):
+    """Nouvelle version de l'historique des utilisateurs dont les calculs ont changé.
+
+    À appeler dans la transaction qui modifie les calculs.
+    """
+    User.query.filter(User.id.in_(set(user_ids))) \
+        .update({User.history_version: User.history_version + 1}, synchronize_session=False)
+
 def get_paris_time():
     paris_tz = pytz.timezone('Europe/Paris')
     return datetime.now(paris_tz)
@@ -90,7 +229,26 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    return render_template('index.html')
+    return render_template('index.html',
+                           tarifs_url=url_for('tarifs', version=pricing_tables.get_tariff_version()))
+
+# Tables et tarifs pour le calculateur du navigateur
+@app.route('/tarifs/<version>.json')
+def tarifs(version):
+    version_courante, donnees, donnees_gzip = pricing_tables.get_bundle()
+    if version != version_courante:
+        return redirect(url_for('tarifs', version=version_courante))
+
+    if 'gzip' in request.accept_encodings:
+        response = make_response(donnees_gzip)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = make_response(donnees)
+    response.mimetype = 'application/json'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.set_etag(version_courante)
+    return response.make_conditional(request)
 
 @app.route('/calculate', methods=['POST'])
 @login_required
@@ -104,15 +262,30 @@ def calculate():
         print(f"🔍 Paramètres reçus: {parameters}")
 
         # Calcul selon le type
-        if calculation_type == 'Assurance Vie':
-            prime = calculate_life_insurance(parameters)
-        elif calculation_type == 'Assurance Non-Vie':
-            prime = calculate_non_life_insurance(parameters)
-        elif calculation_type == 'Assurance Obligatoire':
-            prime = calculate_mandatory_insurance(parameters)
-        else:
+        if calculation_type not in CALCULS:
             return jsonify({'error': 'Type non valide'}), 400
 
+        # Les soumissions identiques simultanées (double clic, relances du
+        # navigateur) partagent un seul calcul et un seul enregistrement
+        cle = ('calculate', current_user.id, calculation_type, json.dumps(parameters, sort_keys=True))
+        resultat = coalesceur.executer(cle, lambda: calculer_et_enregistrer(calculation_type, parameters))
+
+        return jsonify({'success': True, **resultat})
+
+    except Surcharge as e:
+        return reponse_surcharge(e)
+    except ValueError as e:
+        # Paramètres refusés par la validation
+        print(f"❌ Paramètres non valides: {str(e)}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Erreur calcul: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+def calculer_et_enregistrer(calculation_type, parameters):
+    with calcul_admission.admettre(current_user.id):
+        prime = CALCULS[calculation_type](parameters)
+
         print(f"💰 Prime calculée: {prime} UM")
 
         # Sauvegarde du calcul
@@ -121,20 +294,25 @@ def calculate():
             amount=prime,
             parameters=json.dumps(parameters),
             date=get_paris_time(),
-            user_id=current_user.id
+            user_id=current_user.id,
+            tariff_version=pricing_tables.get_tariff_version()
         )
         db.session.add(calculation)
+        invalidate_history([current_user.id])
         db.session.commit()
 
-        return jsonify({
-            'success': True,
-            'prime': prime,
-            'calculation_id': calculation.id
-        })
+        return {'prime': prime, 'calculation_id': calculation.id}
 
-    except Exception as e:
-        print(f"❌ Erreur calcul: {str(e)}")
-        return jsonify({'error': str(e)}), 500
+def reponse_surcharge(erreur):
+    """Réponse 429 immédiate, en JSON pour les appels de l'interface"""
+    print(f"🚦 Requête refusée: {str(erreur)}")
+    if request.is_json:
+        response = jsonify({'error': str(erreur)})
+    else:
+        response = make_response(str(erreur))
+    response.status_code = 429
+    response.headers['Retry-After'] = str(erreur.retry_after)
+    return response
 
 # Fonctions de calcul actuariel
 def get_safe_float(value, default=0.0):
@@ -150,35 +328,24 @@ def get_safe_bool(value):
     """Convertit safely en booléen"""
     return value in [True, 'true', '1', 1]
 
-# Table de mortalité THP-00/02 (identique au JavaScript)
+# Table de mortalité THP-00/02 (partagée avec le JavaScript via /tarifs)
 def get_taux_mortalite(age):
-    table_mortalite = {
-        18: 0.0005, 19: 0.0005, 20: 0.0006, 21: 0.0006, 22: 0.0007, 23: 0.0007, 24: 0.0008,
-        25: 0.0008, 26: 0.0009, 27: 0.0009, 28: 0.0010, 29: 0.0010, 30: 0.0011,
-        31: 0.0012, 32: 0.0013, 33: 0.0014, 34: 0.0015, 35: 0.0016,
-        36: 0.0017, 37: 0.0019, 38: 0.0020, 39: 0.0022, 40: 0.0024,
-        41: 0.0026, 42: 0.0029, 43: 0.0032, 44: 0.0035, 45: 0.0039,
-        46: 0.0043, 47: 0.0048, 48: 0.0053, 49: 0.0059, 50: 0.0066,
-        51: 0.0074, 52: 0.0083, 53: 0.0093, 54: 0.0104, 55: 0.0117,
-        56: 0.0132, 57: 0.0148, 58: 0.0166, 59: 0.0187, 60: 0.0211,
-        61: 0.0238, 62: 0.0268, 63: 0.0302, 64: 0.0340, 65: 0.0383,
-        66: 0.0431, 67: 0.0485, 68: 0.0546, 69: 0.0614, 70: 0.0690,
-        71: 0.0775, 72: 0.0869, 73: 0.0973, 74: 0.1088, 75: 0.1214,
-        76: 0.1352, 77: 0.1502, 78: 0.1664, 79: 0.1838, 80: 0.2024
-    }
-    age_arrondi = max(18, min(80, int(age)))
-    return table_mortalite.get(age_arrondi, 0.05)
+    return pricing_tables.taux_mortalite(age)
 
 def get_taux_mortalite_etendu(age):
     """Table de mortalité étendue au-delà de 80 ans"""
-    if age <= 80:
-        return get_taux_mortalite(age)
-    else:
-        # Taux de mortalité progressif au-delà de 80 ans
-        return min(0.25, 0.05 + (age - 80) * 0.025)
+    return pricing_tables.taux_mortalite_etendu(age)
 
 def calculate_prime_deces_temporaire(capital, age, duree, taux, facteur_risque):
     """Calcul prime pour décès temporaire - CORRIGÉ"""
+    if float(age).is_integer():
+        return pricing_tables.prime_deces_temporaire(capital, age, duree, taux, facteur_risque)
+
+    noyau = kernels.get_noyau('deces_temporaire')
+    if noyau is not None:
+        prime = noyau(kernels.TABLE_Q, float(capital), float(age), int(duree), float(taux))
+        return prime * facteur_risque * pricing_tables.TARIFS['vie']['chargements']['deces']
+
     prime = 0
     taux_interet = taux / 100
 
@@ -188,11 +355,14 @@ def calculate_prime_deces_temporaire(capital, age, duree, taux, facteur_risque):
         facteur_actualisation = (1 + taux_interet) ** -annee
         prime += capital * taux_mortalite * facteur_actualisation
 
-    return prime * facteur_risque * 1.2  # 20% de chargement
+    return prime * facteur_risque * pricing_tables.TARIFS['vie']['chargements']['deces']  # 20% de chargement
 
 
 def calculate_prime_vie_entiere(capital, age, taux, facteur_risque):
     """Calcul prime pour vie entière - FORMULE CORRECTE"""
+    if float(age).is_integer():
+        return pricing_tables.prime_vie_entiere(capital, age, taux, facteur_risque)
+
     prime = 0
     taux_interet = taux / 100
     age_limite = 120
@@ -210,16 +380,19 @@ def calculate_prime_vie_entiere(capital, age, taux, facteur_risque):
         facteur_actualisation = (1 + taux_interet) ** -annee
         prime += capital * probabilite_deces_precis * facteur_actualisation
 
-    return prime * facteur_risque * 1.15  # 15% de chargement
+    return prime * facteur_risque * pricing_tables.TARIFS['vie']['chargements']['vie_entiere']  # 15% de chargement
 
 def calculate_prime_rente_viagere(capital, age, taux, facteur_risque):
     """Calcul prime pour rente viagère - CORRIGÉ"""
+    if float(age).is_integer():
+        return pricing_tables.prime_rente_viagere(capital, age, taux, facteur_risque)
+
     taux_interet = taux / 100
     valeur_actuelle_rente = 0
     age_limite = 120
 
     # La rente verse un revenu ANNUEL jusqu'au décès (8% du capital)
-    rente_annuelle = capital * 0.08
+    rente_annuelle = capital * pricing_tables.TARIFS['vie']['taux_rente']
 
     for annee in range(1, int(age_limite - age) + 1):
         age_actuel = age + annee - 1
@@ -233,62 +406,82 @@ def calculate_prime_rente_viagere(capital, age, taux, facteur_risque):
         valeur_actuelle_rente += rente_annuelle * probabilite_survie * facteur_actualisation
 
     # Pour une rente, la prime est la valeur actuelle de tous les flux futurs
-    return valeur_actuelle_rente * facteur_risque * 1.15  # 15% de chargement
+    return valeur_actuelle_rente * facteur_risque * pricing_tables.TARIFS['vie']['chargements']['rente']  # 15% de chargement
 
-def calculate_life_insurance(params):
-    """Calcul principal pour assurance vie"""
-    # Récupération des paramètres avec les mêmes noms que le JavaScript
+def get_facteur_risque_vie(params):
+    """Fumeur, profession à risque et facteurs médicaux (multiplicatifs)"""
+    facteur_risque = 1.0
+    for cle, facteur in pricing_tables.TARIFS['vie']['facteurs_risque'].items():
+        if get_safe_bool(params.get(cle)):
+            facteur_risque *= facteur
+    return facteur_risque
+
+def get_second_life(params):
+    """Second assuré d'un contrat à deux têtes : (âge, statut), ou (None, '') sur une tête"""
+    statut = params.get('jointType') or ''
+    if not statut:
+        return None, ''
+    if statut not in joint_life.STATUTS:
+        raise ValueError('Statut à deux têtes non reconnu')
+
+    age_second = get_safe_float(params.get('secondAge'), -1)
+    if age_second < 18 or age_second > 80:
+        raise ValueError('L\'âge du second assuré doit être entre 18 et 80 ans')
+    if not age_second.is_integer():
+        raise ValueError('L\'âge du second assuré doit être un nombre entier d\'années')
+    return int(age_second), statut
+
+def get_life_contract(params, age_entier=False):
+    """Paramètres validés d'un contrat vie : (capital, âge, durée, taux, type, facteur de risque).
+
+    Seul chemin de validation des contrats vie (/calculate, /projection,
+    /goal_seek, recalculs). Un âge non entier n'est accepté que pour le décès
+    temporaire sur une tête ; les moteurs vectorisés, qui travaillent sur des
+    âges entiers, demandent age_entier=True plutôt que de tronquer l'âge.
+    """
     capital = get_safe_float(params.get('coverageAmount', 100000))
     age = get_safe_float(params.get('age', 40))
     duree = get_safe_float(params.get('term', 20))
     taux = get_safe_float(params.get('interestRate', 1.5))
     type_contrat = params.get('coverageType', 'deces')
 
-    print(f"📊 Calcul vie - Type: {type_contrat}, Capital: {capital}, Âge: {age}, Durée: {duree}, Taux: {taux}")
-
-    # Validation
     if capital < 1000:
-        return 0.0
+        raise ValueError('Le capital doit être d\'au moins 1 000 UM')
     if age < 18 or age > 80:
         raise ValueError('L\'âge doit être entre 18 et 80 ans')
+    if not age.is_integer() and (age_entier or type_contrat != 'deces' or params.get('jointType')):
+        raise ValueError('L\'âge doit être un nombre entier d\'années pour ce calcul')
     if (type_contrat == 'deces' or type_contrat == 'rente') and (duree < 5 or duree > 40):
         raise ValueError('La durée doit être entre 5 et 40 ans pour ce type de contrat')
+    if type_contrat not in pricing_tables.TARIFS['vie']['chargements']:
+        raise ValueError('Type de contrat non reconnu')
 
-        # Pour vie entière, ignorer la durée
-    if type_contrat == 'vie_entiere':
-        duree = 120 - age  # Couverture jusqu'à 120 ans
-    # Facteurs de risque (MÊME LOGIQUE QUE JAVASCRIPT)
-    facteur_risque = 1.0
-
-    # Facteur fumeur
-    if get_safe_bool(params.get('smokingStatus')):
-        facteur_risque *= 1.8
-        print("  → Fumeur: ×1.8")
-
-    # Facteur profession à risque
-    if get_safe_bool(params.get('highRisk')):
-        facteur_risque *= 1.4
-        print("  → Profession à risque: ×1.4")
+    return capital, age, int(duree), taux, type_contrat, get_facteur_risque_vie(params)
 
-    # Facteurs médicaux
-    if get_safe_bool(params.get('hypertension')):
-        facteur_risque *= 1.3
-        print("  → Hypertension: ×1.3")
+def calculate_life_insurance(params):
+    """Calcul principal pour assurance vie"""
+    # Un capital inférieur à 1 000 UM n'est pas tarifé (prime nulle)
+    if get_safe_float(params.get('coverageAmount', 100000)) < 1000:
+        return 0.0
+    capital, age, duree, taux, type_contrat, facteur_risque = get_life_contract(params)
 
-    if get_safe_bool(params.get('diabetes')):
-        facteur_risque *= 1.5
-        print("  → Diabète: ×1.5")
+    print(f"📊 Calcul vie - Type: {type_contrat}, Capital: {capital}, Âge: {age}, Durée: {duree}, Taux: {taux}")
 
-    if get_safe_bool(params.get('heart_disease')):
-        facteur_risque *= 2.0
-        print("  → Maladie cardiaque: ×2.0")
+    # Pour vie entière, ignorer la durée
+    if type_contrat == 'vie_entiere':
+        duree = 120 - age  # Couverture jusqu'à 120 ans
 
     print(f"  → Facteur risque total: {facteur_risque}")
 
     # Calcul selon le type de contrat
     prime_annuelle = 0
+    age_second, statut = get_second_life(params)
 
-    if type_contrat == 'deces':
+    if statut:
+        prime_annuelle = joint_life.prime_deux_tetes(capital, age, age_second, duree, taux,
+                                                     type_contrat, statut, facteur_risque)
+        print(f"  → Deux têtes ({statut}, second âge {age_second}) - Prime annuelle: {prime_annuelle:.2f} UM")
+    elif type_contrat == 'deces':
         prime_annuelle = calculate_prime_deces_temporaire(capital, age, duree, taux, facteur_risque)
         print(f"  → Décès temporaire - Prime annuelle: {prime_annuelle:.2f} UM")
     elif type_contrat == 'vie_entiere':
@@ -302,31 +495,21 @@ def calculate_life_insurance(params):
 
     # Conversion en mensuel
     prime_mensuelle = prime_annuelle / 12
-    resultat = max(5.0, round(prime_mensuelle, 2))
+    resultat = max(pricing_tables.TARIFS['vie']['prime_minimale'], round(prime_mensuelle, 2))
 
     print(f"💰 Prime mensuelle finale: {resultat} UM")
     return resultat
 
 
-def calculate_non_life_insurance(params):
-    """Calcul pour assurance non-vie - CORRECTION FINALE"""
-    valeur = get_safe_float(params.get('coverageAmount', 50000))
+def get_facteurs_non_vie(params):
+    """Taux de base et facteur total d'un contrat non-vie (prime = valeur x taux x facteur)"""
     risque = get_safe_float(params.get('riskLevel', 1.0))
     garanties = get_safe_float(params.get('guaranteeLevel', 1.0))
 
-    if valeur < 1000:
-        raise ValueError('La valeur assurée doit être d\'au moins 1 000 UM')
-
     # Taux de base selon le type
-    taux_base = 0.015
+    tarifs = pricing_tables.TARIFS['non_vie']
     type_couverture = params.get('coverageType', 'auto')
-
-    if type_couverture == 'auto':
-        taux_base = 0.02
-    elif type_couverture == 'home':
-        taux_base = 0.012
-    elif type_couverture == 'accident':
-        taux_base = 0.008
+    taux_base = tarifs['taux_base'].get(type_couverture, tarifs['taux_defaut'])
 
     # Facteurs supplémentaires - APPLIQUER TOUS LES FACTEURS
     facteur_total = 1.0
@@ -338,55 +521,653 @@ def calculate_non_life_insurance(params):
     facteur_total *= garanties
 
     # Garanties supplémentaires (multiplicatives)
-    if get_safe_bool(params.get('accident')):
-        facteur_total *= 1.2
-    if get_safe_bool(params.get('theft')):
-        facteur_total *= 1.15
-    if get_safe_bool(params.get('natural_disaster')):
-        facteur_total *= 1.25
+    for cle, facteur in tarifs['garanties'].items():
+        if get_safe_bool(params.get(cle)):
+            facteur_total *= facteur
+
+    return taux_base, facteur_total
+
+def calculate_non_life_insurance(params):
+    """Calcul pour assurance non-vie - CORRECTION FINALE"""
+    valeur = get_safe_float(params.get('coverageAmount', 50000))
 
+    if valeur < 1000:
+        raise ValueError('La valeur assurée doit être d\'au moins 1 000 UM')
+
+    taux_base, facteur_total = get_facteurs_non_vie(params)
     print(f"🔍 Non-Vie - Valeur: {valeur}, Taux: {taux_base}, Facteur total: {facteur_total}")
 
     prime = valeur * taux_base * facteur_total
     return round(prime, 2)
 
-def calculate_mandatory_insurance(params):
-    """Calcul pour assurance obligatoire"""
-    base = get_safe_float(params.get('coverageAmount', 20000))
+def get_facteurs_obligatoire(params):
+    """Taux réglementaire, catégorie et région (prime = base x taux x catégorie x région)"""
     categorie = get_safe_float(params.get('riskCategory', 1.0))
     region = get_safe_float(params.get('region', 1.0))
 
-    if base < 1000:
-        raise ValueError('La base de calcul doit être d\'au moins 1 000 UM')
-
     # Taux réglementaire selon le type
-    taux_reglementaire = 0.02
+    tarifs = pricing_tables.TARIFS['obligatoire']
     type_couverture = params.get('coverageType', 'auto_liability')
+    taux_reglementaire = tarifs['taux_reglementaire'].get(type_couverture, tarifs['taux_defaut'])
 
-    if type_couverture == 'auto_liability':
-        taux_reglementaire = 0.015
-    elif type_couverture == 'health':
-        taux_reglementaire = 0.025
-    elif type_couverture == 'professional':
-        taux_reglementaire = 0.018
+    return taux_reglementaire, categorie, region
 
+def calculate_mandatory_insurance(params):
+    """Calcul pour assurance obligatoire"""
+    base = get_safe_float(params.get('coverageAmount', 20000))
+
+    if base < 1000:
+        raise ValueError('La base de calcul doit être d\'au moins 1 000 UM')
+
+    taux_reglementaire, categorie, region = get_facteurs_obligatoire(params)
     prime = base * taux_reglementaire * categorie * region
     return round(prime, 2)
 
+CALCULS = {
+    'Assurance Vie': calculate_life_insurance,
+    'Assurance Non-Vie': calculate_non_life_insurance,
+    'Assurance Obligatoire': calculate_mandatory_insurance
+}
+
+# Profilage des fonctions de tarification (sans surcoût tant qu'il est désactivé).
+# L'état est partagé par les workers dans instance/profilage/
+profileur = Profileur(os.path.join(app.instance_path, 'profilage'))
+profileur.enregistrer(globals(), [
+    'calculate_prime_deces_temporaire', 'calculate_prime_vie_entiere', 'calculate_prime_rente_viagere',
+    'calculate_life_insurance', 'calculate_non_life_insurance', 'calculate_mandatory_insurance'
+])
+profileur.enregistrer(CALCULS, list(CALCULS))
+profileur.enregistrer(PremiumCalculator, [nom for nom, valeur in vars(PremiumCalculator).items()
+                                          if callable(valeur) and not nom.startswith('_')],
+                      prefixe='PremiumCalculator.')
+if os.environ.get('CALCULATEUR_PROFILAGE') == '1':
+    profileur.activer()
+
+def est_admin():
+    return current_user.is_authenticated and current_user.username == 'admin'
+
+@app.route('/admin/profilage', methods=['GET', 'POST'])
+@login_required
+def admin_profilage():
+    """Statistiques par fonction, tous workers confondus ;
+    POST {"action": "activer" | "desactiver" | "reinitialiser"} vaut pour tous les workers"""
+    if not est_admin():
+        return jsonify({'error': 'Accès non autorisé'}), 403
+
+    if request.method == 'POST':
+        actions = {
+            'activer': profileur.activer,
+            'desactiver': profileur.desactiver,
+            'reinitialiser': profileur.reinitialiser
+        }
+        action = (request.get_json(silent=True) or {}).get('action')
+        if action not in actions:
+            return jsonify({'error': 'Action non valide'}), 400
+        actions[action]()
+
+    return jsonify(profileur.rapport())
+
+# Chaque worker applique l'état partagé du profilage avant la requête
+# et publie ses statistiques après
+@app.before_request
+def synchroniser_profilage():
+    profileur.synchroniser()
+
+@app.teardown_request
+def publier_profilage(exception):
+    profileur.publier()
+
+# Profil d'une requête à la demande : ?profil=cprofile ou ?profil=pile (admin)
+@app.before_request
+def demarrer_profil_requete():
+    mode = request.args.get('profil')
+    if mode in ProfilRequete.MODES and est_admin():
+        g.profil = ProfilRequete(mode, os.path.join(app.instance_path, 'profils'),
+                                 f'{request.endpoint}-{int(time.time() * 1000)}')
+        g.profil.demarrer()
+
+@app.after_request
+def arreter_profil_requete(response):
+    profil = g.pop('profil', None)
+    if profil is not None:
+        chemin = profil.arreter()
+        response.headers['X-Profil'] = os.path.basename(chemin)
+        print(f"🔬 Profil de requête écrit: {chemin}")
+    return response
+
+@app.teardown_request
+def abandonner_profil_requete(exception):
+    # Requête interrompue par une exception : after_request n'a pas été appelé
+    profil = g.pop('profil', None)
+    if profil is not None:
+        profil.arreter()
+
+# Recherche inverse : capital, durée ou âge donnant une prime cible
+INCONNUES = {'capital': 'coverageAmount', 'duree': 'term', 'age': 'age'}
+
+def evaluateur_prime(calculation_type, params, inconnue):
+    """Fonction vectorisée : valeurs candidates de l'inconnue -> primes (unité de /calculate)"""
+    if calculation_type == 'Assurance Vie':
+        capital, age, duree, taux, type_contrat, facteur_risque = get_life_contract(params, age_entier=True)
+        age_second, statut = get_second_life(params)
+        if inconnue == 'duree' and type_contrat != 'deces':
+            raise ValueError('La durée n\'influence pas la prime de ce contrat')
+
+        def evaluer(valeurs):
+            nombre = len(valeurs)
+            capitaux = valeurs if inconnue == 'capital' else np.full(nombre, capital)
+            ages = valeurs if inconnue == 'age' else np.full(nombre, int(age))
+            durees = valeurs if inconnue == 'duree' else np.full(nombre, duree)
+            if statut:
+                annuelles = joint_life.primes_deux_tetes(capitaux, ages, np.full(nombre, age_second), durees, taux,
+                                                         [type_contrat] * nombre, [statut] * nombre,
+                                                         np.full(nombre, facteur_risque))
+            else:
+                annuelles = pricing_tables.primes_vie(capitaux, ages, durees, taux, type_contrat, facteur_risque)
+            return np.maximum(pricing_tables.TARIFS['vie']['prime_minimale'], np.round(annuelles / 12, 2))
+
+        return evaluer
+
+    if inconnue != 'capital':
+        raise ValueError('Seul le capital peut être recherché pour ce type d\'assurance')
+    if calculation_type == 'Assurance Non-Vie':
+        facteurs = get_facteurs_non_vie(params)
+    else:
+        facteurs = get_facteurs_obligatoire(params)
+
+    def evaluer(valeurs):
+        primes = np.asarray(valeurs, dtype=float)
+        for facteur in facteurs:
+            primes = primes * facteur
+        return np.round(primes, 2)
+
+    return evaluer
+
+def rechercher_inconnue(calculation_type, params, inconnue, prime_cible):
+    """Plus grand capital, ou durée/âge entier, dont la prime ne dépasse pas la cible.
+
+    Retourne None si aucune valeur ne convient (cible inférieure à la prime minimale).
+    """
+    evaluer = evaluateur_prime(calculation_type, params, inconnue)
+    capital_max = app.config['GOAL_SEEK_CAPITAL_MAX']
+
+    def prime_reelle(valeur):
+        return CALCULS[calculation_type](dict(params, **{INCONNUES[inconnue]: str(valeur)}))
+
+    if inconnue == 'capital':
+        capital, evaluations = resoudre_continu(evaluer, prime_cible, 1000, capital_max)
+        if capital is None:
+            return None
+        valeur, admissibles = int(capital), None
+    else:
+        bornes = {'duree': (5, 40), 'age': (18, 80)}[inconnue]
+        valeurs = np.arange(bornes[0], bornes[1] + 1)
+        resultat = resoudre_discret(evaluer, prime_cible, valeurs)
+        if resultat is None:
+            return None
+        valeur, _, admissibles = resultat
+        evaluations = len(valeurs)
+
+    # Vérification par le calcul de /calculate, et pour le capital ajustement
+    # à l'unité près (la recherche s'arrête juste sous la borne)
+    prime = prime_reelle(valeur)
+    if inconnue == 'capital':
+        while prime > prime_cible and valeur > 1000:
+            valeur -= 1
+            prime = prime_reelle(valeur)
+        while valeur < capital_max:
+            prime_suivante = prime_reelle(valeur + 1)
+            if prime_suivante > prime_cible:
+                break
+            valeur, prime = valeur + 1, prime_suivante
+    if prime > prime_cible:
+        return None
+
+    return {
+        'inconnue': inconnue,
+        'valeur': valeur,
+        'prime': prime,
+        'admissibles': admissibles,
+        'evaluations': evaluations
+    }
+
+@app.route('/goal_seek', methods=['POST'])
+@login_required
+def goal_seek():
+    """Résout le capital, la durée ou l'âge pour une prime cible (POST JSON)"""
+    try:
+        data = request.get_json() or {}
+        calculation_type = data.get('type')
+        parameters = data.get('parameters', {})
+        inconnue = data.get('inconnue', 'capital')
+        prime_cible = get_safe_float(data.get('prime_cible'), -1)
+
+        if calculation_type not in CALCULS:
+            return jsonify({'error': 'Type non valide'}), 400
+        if inconnue not in INCONNUES:
+            return jsonify({'error': 'Inconnue non valide'}), 400
+        if prime_cible <= 0:
+            return jsonify({'error': 'La prime cible doit être positive'}), 400
+
+        debut = time.perf_counter()
+        resultat = rechercher_inconnue(calculation_type, parameters, inconnue, prime_cible)
+        duree_ms = (time.perf_counter() - debut) * 1000
+        if resultat is None:
+            return jsonify({'error': 'Aucune valeur ne permet d\'atteindre cette prime'}), 422
+
+        print(f"🎯 Recherche {inconnue} - Cible: {prime_cible} UM, Valeur: {resultat['valeur']} ({duree_ms:.1f} ms)")
+        return jsonify({'success': True, 'duree_ms': duree_ms, **resultat})
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Erreur recherche: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Projection multi-décréments (décès, chute, rachat)
+def projeter_portefeuille(contrats):
+    """Projette une liste de contrats vie (paramètres du formulaire)"""
+    capitaux, ages, durees, taux, types, facteurs = zip(*[get_life_contract(params, age_entier=True)
+                                                          for params in contrats])
+    ages = [int(age) for age in ages]
+    seconds = [get_second_life(params) for params in contrats]
+    ages_second = [age_second if statut else age for (age_second, statut), age in zip(seconds, ages)]
+    statuts = [statut for _, statut in seconds]
+    return projection.projeter(ages, durees, capitaux, types, taux, facteurs, ages_second, statuts)
+
+def resume_projection(resultat):
+    """Primes par contrat au format JSON"""
+    return [
+        {
+            'prime_annuelle': round(float(prime), 2),
+            'prime_unique': round(float(unique), 2),
+            'va_prestations': round(float(va), 2)
+        }
+        for prime, unique, va in zip(resultat['prime_annuelle'], resultat['prime_unique'],
+                                     resultat['va_prestations'])
+    ]
+
+@app.route('/projection', methods=['POST'])
+@login_required
+def projection_portefeuille():
+    try:
+        data = request.get_json()
+        contrats = data.get('contrats') or [data.get('parameters', {})]
+
+        resultat = projeter_portefeuille(contrats)
+        flux = projection.flux_agreges(resultat)
+
+        print(f"📈 Projection de {len(contrats)} contrat(s) sur {len(flux['en_vigueur'])} ans")
+
+        return jsonify({
+            'success': True,
+            'contrats': resume_projection(resultat),
+            'flux': {cle: np.round(valeurs, 2).tolist() for cle, valeurs in flux.items()}
+        })
+
+    except Exception as e:
+        print(f"❌ Erreur projection: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Tâches longues exécutées par worker.py
+@job_queue.tache('projection')
+def job_projection(parametres, rapporter):
+    """Projection d'un portefeuille complet, par blocs de contrats"""
+    contrats = parametres.get('contrats', [])
+    taille_bloc = int(parametres.get('taille_bloc', 5000))
+    primes = []
+    flux = {}
+
+    for debut in range(0, len(contrats), taille_bloc):
+        resultat = projeter_portefeuille(contrats[debut:debut + taille_bloc])
+        primes.extend(resume_projection(resultat))
+        for cle, valeurs in projection.flux_agreges(resultat).items():
+            cumul = flux.get(cle, np.zeros(0))
+            taille = max(len(cumul), len(valeurs))
+            flux[cle] = np.pad(cumul, (0, taille - len(cumul))) + np.pad(valeurs, (0, taille - len(valeurs)))
+        rapporter(min(1.0, (debut + taille_bloc) / len(contrats)))
+
+    return {
+        'contrats': primes,
+        'flux': {cle: np.round(valeurs, 2).tolist() for cle, valeurs in flux.items()}
+    }
+
+def job_to_dict(job):
+    return {
+        'id': job['id'],
+        'type': job['type'],
+        'statut': job['statut'],
+        'progression': round(job['progression'], 4),
+        'erreur': job['erreur'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+        'resultat': url_for('job_result', job_id=job['id']) if job['statut'] == 'termine' else None
+    }
+
+def get_user_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job['user_id'] != current_user.id:
+        return None
+    return job
+
+# Tâches portant sur les calculs de tous les utilisateurs
+TACHES_ADMIN = {'archivage', 'repricing'}
+
+@app.route('/jobs', methods=['POST'])
+@login_required
+def submit_job():
+    try:
+        data = request.get_json()
+        if data.get('type') in TACHES_ADMIN:
+            if not est_admin():
+                return jsonify({'error': 'Accès non autorisé'}), 403
+            if data.get('type') == 'archivage':
+                get_age_archivage(data.get('parametres', {}))
+        job_id = job_queue.soumettre(data.get('type'), data.get('parametres', {}), current_user.id)
+        print(f"📥 Tâche {job_id} soumise ({data.get('type')})")
+        return jsonify(job_to_dict(job_queue.get(job_id))), 202
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche introuvable'}), 404
+    return jsonify(job_to_dict(job))
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    if get_user_job(job_id) is None:
+        return jsonify({'error': 'Tâche introuvable'}), 404
+    job_queue.annuler(job_id)
+    return jsonify(job_to_dict(job_queue.get(job_id)))
+
+@app.route('/jobs/<int:job_id>/result')
+@login_required
+def job_result(job_id):
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Tâche introuvable'}), 404
+    if job['statut'] != 'termine':
+        return jsonify({'error': 'Résultat non disponible', 'statut': job['statut']}), 409
+    return send_file(job['chemin_resultat'], mimetype='application/json',
+                     download_name=f'job_{job_id}.json')
+
+# Recalcul des calculs sauvegardés après un changement de tarif
+def composantes_utilisees(calculation_type, params):
+    """Composantes du tarif (voir pricing_tables.get_empreintes) dont dépend un calcul"""
+    tarifs = pricing_tables.TARIFS
+    if calculation_type == 'Assurance Vie':
+        type_contrat = params.get('coverageType', 'deces')
+        composantes = {'mortalite', 'vie.prime_minimale', f'vie.chargements.{type_contrat}'}
+        if type_contrat == 'rente':
+            composantes.add('vie.taux_rente')
+        cles = tarifs['vie']['facteurs_risque']
+        prefixe = 'vie.facteurs_risque'
+    elif calculation_type == 'Assurance Non-Vie':
+        type_couverture = params.get('coverageType', 'auto')
+        composantes = {f'non_vie.taux_base.{type_couverture}', 'non_vie.taux_defaut'}
+        cles = tarifs['non_vie']['garanties']
+        prefixe = 'non_vie.garanties'
+    else:
+        type_couverture = params.get('coverageType', 'auto_liability')
+        return {f'obligatoire.taux_reglementaire.{type_couverture}', 'obligatoire.taux_defaut'}
+
+    composantes.update(f'{prefixe}.{cle}' for cle in cles if get_safe_bool(params.get(cle)))
+    return composantes
+
+def composantes_modifiees(anciennes, nouvelles):
+    """Composantes dont l'empreinte diffère entre deux versions (toutes si inconnue)"""
+    if anciennes is None:
+        return set(nouvelles)
+    return {cle for cle in set(anciennes) | set(nouvelles) if anciennes.get(cle) != nouvelles.get(cle)}
+
+def enregistrer_version_tarif():
+    """Conserve les empreintes de la version courante pour les recalculs futurs"""
+    version = pricing_tables.get_tariff_version()
+    if TariffVersion.query.get(version) is None:
+        db.session.add(TariffVersion(
+            version=version,
+            empreintes=json.dumps(pricing_tables.get_empreintes()),
+            date=get_paris_time()
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Déjà enregistrée par un autre processus démarré en même temps
+            db.session.rollback()
+    return version
+
+def calculer_unitaire(calculation_type, params):
+    """Montant d'un calcul sauvegardé, ou l'exception qui l'empêche"""
+    try:
+        return CALCULS[calculation_type](params)
+    except Exception as e:
+        return e
+
+def calculer_lot(calculation_type, contrats):
+    """Montants d'une liste de calculs sauvegardés, dans l'ordre (ou l'exception de chacun).
+
+    Les contrats vie à âge entier sont tarifés ensemble : une tête par
+    pricing_tables.primes_vie (par type de contrat et taux), deux têtes par
+    joint_life.primes_deux_tetes. Les autres passent un par un par CALCULS.
+    """
+    if calculation_type != 'Assurance Vie':
+        return [calculer_unitaire(calculation_type, params) for params in contrats]
+
+    montants = [None] * len(contrats)
+    une_tete = {}
+    deux_tetes = []
+    for index, params in enumerate(contrats):
+        try:
+            if get_safe_float(params.get('coverageAmount', 100000)) < 1000:
+                montants[index] = 0.0
+                continue
+            capital, age, duree, taux, type_contrat, facteur_risque = get_life_contract(params)
+            age_second, statut = get_second_life(params)
+        except ValueError as e:
+            montants[index] = e
+            continue
+        if not age.is_integer():
+            montants[index] = calculer_unitaire(calculation_type, params)
+        elif statut:
+            if type_contrat == 'vie_entiere':
+                duree = 120 - age
+            deux_tetes.append((index, capital, int(age), age_second, duree, taux, type_contrat, statut,
+                               facteur_risque))
+        else:
+            une_tete.setdefault((type_contrat, taux), []).append((index, capital, int(age), duree, facteur_risque))
+
+    annuelles = {}
+    for (type_contrat, taux), lignes in une_tete.items():
+        indices, capitaux, ages, durees, facteurs = zip(*lignes)
+        annuelles.update(zip(indices, pricing_tables.primes_vie(capitaux, ages, durees, taux, type_contrat,
+                                                                 np.asarray(facteurs))))
+    if deux_tetes:
+        indices, capitaux, ages, ages_second, durees, taux, types, statuts, facteurs = zip(*deux_tetes)
+        annuelles.update(zip(indices, joint_life.primes_deux_tetes(capitaux, ages, ages_second, durees, taux,
+                                                                    types, statuts, facteurs)))
+
+    prime_minimale = pricing_tables.TARIFS['vie']['prime_minimale']
+    for index, prime_annuelle in annuelles.items():
+        montants[index] = max(prime_minimale, round(float(prime_annuelle) / 12, 2))
+    return montants
+
+def reprice_calculations(taille_bloc=1000, rapporter=lambda progression: None):
+    """Met les calculs sauvegardés à la version courante du tarif, par blocs.
+
+    Seuls les calculs dont une composante utilisée a changé sont recalculés ;
+    les autres changent seulement de version. Chaque bloc est écrit avec son
+    point de reprise : un recalcul interrompu reprend après le dernier bloc.
+    """
+    version = enregistrer_version_tarif()
+    empreintes = pricing_tables.get_empreintes()
+    anciennes = {v.version: json.loads(v.empreintes) for v in TariffVersion.query.all()}
+
+    run = RepricingRun.query.filter_by(tariff_version=version).first()
+    if run is None:
+        run = RepricingRun(tariff_version=version, date_debut=get_paris_time())
+        db.session.add(run)
+    if run.statut == 'termine':
+        # Nouveau passage sur les calculs restés en erreur
+        run.dernier_id = run.recalcules = run.inchanges = run.erreurs = 0
+        run.statut = 'en_cours'
+        run.date_debut = get_paris_time()
+        run.date_fin = None
+    db.session.commit()
+
+    perime = db.or_(Calculation.tariff_version.is_(None), Calculation.tariff_version != version)
+    total = Calculation.query.filter(perime, Calculation.id > run.dernier_id).count()
+    traites = 0
+    print(f"🔁 Recalcul vers le tarif {version}: {total} calcul(s) à partir de l'id {run.dernier_id}")
+
+    while True:
+        bloc = db.session.query(Calculation.id, Calculation.type, Calculation.parameters,
+                                Calculation.tariff_version, Calculation.user_id) \
+            .filter(perime, Calculation.id > run.dernier_id) \
+            .order_by(Calculation.id) \
+            .limit(taille_bloc) \
+            .all()
+        if not bloc:
+            break
+
+        mises_a_jour = []
+        utilisateurs = set()
+        modifiees_par_version = {}
+        a_recalculer = {}
+        for calc_id, calculation_type, parameters, ancienne_version, user_id in bloc:
+            if ancienne_version not in modifiees_par_version:
+                modifiees_par_version[ancienne_version] = composantes_modifiees(anciennes.get(ancienne_version),
+                                                                                empreintes)
+            params = json.loads(parameters)
+            if composantes_utilisees(calculation_type, params) & modifiees_par_version[ancienne_version]:
+                a_recalculer.setdefault(calculation_type, []).append((calc_id, user_id, params))
+            else:
+                run.inchanges += 1
+                mises_a_jour.append({'id': calc_id, 'tariff_version': version})
+
+        # Un appel aux moteurs vectorisés par type de calcul et par bloc
+        for calculation_type, lignes in a_recalculer.items():
+            montants = calculer_lot(calculation_type, [params for _, _, params in lignes])
+            for (calc_id, user_id, _), montant in zip(lignes, montants):
+                if isinstance(montant, Exception):
+                    # Le calcul garde son montant et sa version, il sera repris au prochain passage
+                    print(f"❌ Recalcul impossible pour le calcul {calc_id}: {str(montant)}")
+                    run.erreurs += 1
+                    continue
+                mises_a_jour.append({'id': calc_id, 'tariff_version': version, 'amount': montant})
+                utilisateurs.add(user_id)
+                run.recalcules += 1
+
+        # Résultats et point de reprise dans la même transaction
+        db.session.bulk_update_mappings(Calculation, mises_a_jour)
+        if utilisateurs:
+            invalidate_history(utilisateurs)
+        run.dernier_id = bloc[-1][0]
+        db.session.commit()
+
+        traites += len(bloc)
+        rapporter(min(1.0, traites / total) if total else 1.0)
+
+    run.statut = 'termine'
+    run.date_fin = get_paris_time()
+    db.session.commit()
+    print(f"✅ Recalcul terminé: {run.recalcules} recalculé(s), {run.inchanges} inchangé(s), {run.erreurs} erreur(s)")
+    return {
+        'tariff_version': version,
+        'recalcules': run.recalcules,
+        'inchanges': run.inchanges,
+        'erreurs': run.erreurs
+    }
+
+@job_queue.tache('repricing')
+def job_repricing(parametres, rapporter):
+    with app.app_context():
+        return reprice_calculations(int(parametres.get('taille_bloc', 1000)), rapporter)
+
+@app.cli.command('reprice')
+def reprice_command():
+    """Recalcule les calculs sauvegardés après un changement de tarif"""
+    reprice_calculations()
+
+# Archivage des anciens calculs
+def archive_calculations(age_jours=None, taille_bloc=1000, rapporter=lambda progression: None):
+    """Déplace les calculs plus anciens que age_jours vers l'archive compressée"""
+    if age_jours is None:
+        age_jours = app.config['ARCHIVE_AGE_JOURS']
+    # Les dates sont enregistrées à l'heure de Paris
+    avant = get_paris_time() - timedelta(days=age_jours)
+    return archive_calculs.archiver(avant, taille_bloc, rapporter)
+
+def get_age_archivage(parametres):
+    """Âge demandé pour une tâche d'archivage, jamais inférieur à ARCHIVE_AGE_JOURS"""
+    try:
+        age_jours = int(parametres.get('age_jours', app.config['ARCHIVE_AGE_JOURS']))
+    except (TypeError, ValueError):
+        raise ValueError('age_jours doit être un nombre entier de jours')
+    if age_jours < app.config['ARCHIVE_AGE_JOURS']:
+        raise ValueError(f"age_jours doit être d'au moins {app.config['ARCHIVE_AGE_JOURS']} jours")
+    return age_jours
+
+@job_queue.tache('archivage')
+def job_archivage(parametres, rapporter):
+    archives = archive_calculations(get_age_archivage(parametres), int(parametres.get('taille_bloc', 1000)), rapporter)
+    return {'archives': archives}
+
+@app.cli.command('archive')
+@click.option('--age-jours', type=int, default=None, help='Âge minimal des calculs à archiver')
+@click.option('--vacuum', is_flag=True, help='Compacte ensuite la base (VACUUM)')
+def archive_command(age_jours, vacuum):
+    """Archive les anciens calculs dans des fichiers mensuels compressés"""
+    archives = archive_calculations(age_jours)
+    print(f"🗄️ Archivage terminé : {archives} calculs")
+    if vacuum:
+        db.session.execute(db.text('VACUUM'))
+        print("🗄️ Base compactée")
+
+def get_calculation_or_404(calculation_id):
+    """Calcul de la base, ou relu dans l'archive s'il a été archivé"""
+    calculation = Calculation.query.get(calculation_id) or archive_calculs.get(calculation_id)
+    if calculation is None:
+        abort(404)
+    return calculation
+
 # Historique
 @app.route('/history')
 @login_required
 def history():
-    calculations = Calculation.query.filter_by(user_id=current_user.id) \
-        .order_by(Calculation.date.desc()) \
-        .all()
-    return render_template('history.html', calculations=calculations)
+    # La version de l'historique est chargée avec l'utilisateur : pas de requête
+    # sur les calculs tant qu'ils n'ont pas changé
+    version = current_user.history_version or 0
+    etag = f'{HISTORY_ETAG_PREFIX}-{current_user.id}-{version}'
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        fragment = history_cache.get(current_user.id, version)
+        if fragment is None:
+            calculations = Calculation.query.filter_by(user_id=current_user.id) \
+                .order_by(Calculation.date.desc()) \
+                .all()
+            # Les calculs archivés restent consultables depuis l'historique
+            calculations = sorted(calculations + archive_calculs.lister(current_user.id),
+                                  key=lambda calculation: calculation.date, reverse=True)
+            fragment = render_template('_history_table.html', calculations=calculations)
+            history_cache.set(current_user.id, version, fragment)
+        response = make_response(render_template('history.html', historique=Markup(fragment)))
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 # Détails du calcul
 @app.route('/calculation_details/<int:calculation_id>')
 @login_required
 def calculation_details(calculation_id):
-    calculation = Calculation.query.get_or_404(calculation_id)
+    calculation = get_calculation_or_404(calculation_id)
     if calculation.user_id != current_user.id:
         flash('Accès non autorisé')
         return redirect(url_for('history'))
@@ -396,159 +1177,170 @@ def calculation_details(calculation_id):
                            parameters=json.loads(calculation.parameters))
 
 # Génération PDF
+def construire_pdf(calculation):
+    """Rapport PDF d'un calcul, en octets"""
+    parameters = json.loads(calculation.parameters)
+
+    # Créer le PDF avec reportlab
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=50, bottomMargin=50)
+    styles = getSampleStyleSheet()
+    story = []
+
+    # Style personnalisé
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1,
+        textColor=colors.HexColor('#2c3e50'),
+        fontName='Helvetica-Bold'
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=12,
+        spaceBefore=20,
+        textColor=colors.HexColor('#3498db'),
+        fontName='Helvetica-Bold'
+    )
+
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=6
+    )
+
+    # Titre principal
+    title = Paragraph("RAPPORT DE CALCUL ACTUARIEL", title_style)
+    story.append(title)
+    story.append(Spacer(1, 20))
+
+    # Informations générales
+    story.append(Paragraph("INFORMATIONS GÉNÉRALES", heading_style))
+
+    info_data = [
+        [Paragraph("<b>Référence</b>", normal_style), Paragraph(f"CAL-{calculation.id:04d}", normal_style)],
+        [Paragraph("<b>Date de génération</b>", normal_style),
+         Paragraph(datetime.now().strftime('%d/%m/%Y à %H:%M'), normal_style)],
+        [Paragraph("<b>Date du calcul</b>", normal_style),
+         Paragraph(calculation.date.strftime('%d/%m/%Y à %H:%M'), normal_style)],
+        [Paragraph("<b>Type d'assurance</b>", normal_style), Paragraph(calculation.type, normal_style)],
+        [Paragraph("<b>Montant calculé</b>", normal_style),
+         Paragraph(f"{calculation.amount:,.2f} UM", normal_style)],
+    ]
+
+    info_table = Table(info_data, colWidths=[120, 250])
+    info_table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8f9fa')),
+        ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('TOPPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dee2e6')),
+    ]))
+    story.append(info_table)
+    story.append(Spacer(1, 25))
+
+    # Paramètres du calcul
+    story.append(Paragraph("PARAMÈTRES DU CALCUL", heading_style))
+
+    # Organiser les paramètres
+    param_data = []
+    for key, value in parameters.items():
+        if key not in ['insuranceBranch']:
+            formatted_key = key.replace('_', ' ').title()
+            param_data.append([formatted_key, str(value)])
+
+    if param_data:
+        param_table = Table(param_data, colWidths=[180, 190])
+        param_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8f4fd')),
+            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e9ecef')),
+        ]))
+        story.append(param_table)
+
+    story.append(Spacer(1, 25))
+
+    # Notes et mentions légales
+    story.append(Paragraph("INFORMATIONS COMPLÉMENTAIRES", heading_style))
+
+    notes_style = ParagraphStyle(
+        'NotesStyle',
+        parent=styles['Italic'],
+        fontSize=9,
+        textColor=colors.HexColor('#6c757d'),
+        leftIndent=10
+    )
+
+    notes = [
+        "Ce rapport a été généré automatiquement par le Calculateur Actuariel.",
+        "Les calculs sont basés sur les paramètres fournis par l'utilisateur.",
+        "Ce document est fourni à titre informatif et ne constitue pas une offre contractuelle.",
+        f"Document généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}"
+    ]
+
+    for note in notes:
+        story.append(Paragraph(f"• {note}", notes_style))
+        story.append(Spacer(1, 4))
+
+    story.append(Spacer(1, 20))
+
+    # Pied de page
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=8,
+        textColor=colors.HexColor('#6c757d'),
+        alignment=1
+    )
+
+    footer = Paragraph(
+        "Calculateur Actuariel - Développé par Enock NIHORIMBERE",
+        footer_style
+    )
+    story.append(footer)
+
+    # Générer le PDF
+    doc.build(story)
+    return buffer.getvalue()
+
 @app.route('/generate_pdf/<int:calculation_id>')
 @login_required
 def generate_pdf(calculation_id):
     try:
-        calculation = Calculation.query.get_or_404(calculation_id)
+        calculation = get_calculation_or_404(calculation_id)
         if calculation.user_id != current_user.id:
             return "Accès non autorisé", 403
 
-        parameters = json.loads(calculation.parameters)
-
-        # Créer le PDF avec reportlab
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=50, bottomMargin=50)
-        styles = getSampleStyleSheet()
-        story = []
-
-        # Style personnalisé
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30,
-            alignment=1,
-            textColor=colors.HexColor('#2c3e50'),
-            fontName='Helvetica-Bold'
-        )
-
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=12,
-            spaceBefore=20,
-            textColor=colors.HexColor('#3498db'),
-            fontName='Helvetica-Bold'
-        )
+        # Les demandes simultanées du même rapport partagent une seule génération
+        def generer():
+            with pdf_admission.admettre(current_user.id):
+                return construire_pdf(calculation)
 
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=6
-        )
-
-        # Titre principal
-        title = Paragraph("RAPPORT DE CALCUL ACTUARIEL", title_style)
-        story.append(title)
-        story.append(Spacer(1, 20))
-
-        # Informations générales
-        story.append(Paragraph("INFORMATIONS GÉNÉRALES", heading_style))
-
-        info_data = [
-            [Paragraph("<b>Référence</b>", normal_style), Paragraph(f"CAL-{calculation.id:04d}", normal_style)],
-            [Paragraph("<b>Date de génération</b>", normal_style),
-             Paragraph(datetime.now().strftime('%d/%m/%Y à %H:%M'), normal_style)],
-            [Paragraph("<b>Date du calcul</b>", normal_style),
-             Paragraph(calculation.date.strftime('%d/%m/%Y à %H:%M'), normal_style)],
-            [Paragraph("<b>Type d'assurance</b>", normal_style), Paragraph(calculation.type, normal_style)],
-            [Paragraph("<b>Montant calculé</b>", normal_style),
-             Paragraph(f"{calculation.amount:,.2f} UM", normal_style)],
-        ]
-
-        info_table = Table(info_data, colWidths=[120, 250])
-        info_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#f8f9fa')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#dee2e6')),
-        ]))
-        story.append(info_table)
-        story.append(Spacer(1, 25))
-
-        # Paramètres du calcul
-        story.append(Paragraph("PARAMÈTRES DU CALCUL", heading_style))
-
-        # Organiser les paramètres
-        param_data = []
-        for key, value in parameters.items():
-            if key not in ['insuranceBranch']:
-                formatted_key = key.replace('_', ' ').title()
-                param_data.append([formatted_key, str(value)])
-
-        if param_data:
-            param_table = Table(param_data, colWidths=[180, 190])
-            param_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e8f4fd')),
-                ('TEXTCOLOR', (0, 0), (-1, -1), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-                ('TOPPADDING', (0, 0), (-1, -1), 6),
-                ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e9ecef')),
-            ]))
-            story.append(param_table)
-
-        story.append(Spacer(1, 25))
-
-        # Notes et mentions légales
-        story.append(Paragraph("INFORMATIONS COMPLÉMENTAIRES", heading_style))
-
-        notes_style = ParagraphStyle(
-            'NotesStyle',
-            parent=styles['Italic'],
-            fontSize=9,
-            textColor=colors.HexColor('#6c757d'),
-            leftIndent=10
-        )
-
-        notes = [
-            "Ce rapport a été généré automatiquement par le Calculateur Actuariel.",
-            "Les calculs sont basés sur les paramètres fournis par l'utilisateur.",
-            "Ce document est fourni à titre informatif et ne constitue pas une offre contractuelle.",
-            f"Document généré le {datetime.now().strftime('%d/%m/%Y à %H:%M')}"
-        ]
-
-        for note in notes:
-            story.append(Paragraph(f"• {note}", notes_style))
-            story.append(Spacer(1, 4))
-
-        story.append(Spacer(1, 20))
-
-        # Pied de page
-        footer_style = ParagraphStyle(
-            'Footer',
-            parent=styles['Normal'],
-            fontSize=8,
-            textColor=colors.HexColor('#6c757d'),
-            alignment=1
-        )
-
-        footer = Paragraph(
-            "Calculateur Actuariel - Développé par Enock NIHORIMBERE",
-            footer_style
-        )
-        story.append(footer)
-
-        # Générer le PDF
-        doc.build(story)
-        buffer.seek(0)
+        contenu = coalesceur.executer(('pdf', calculation.id, calculation.amount), generer)
 
         return send_file(
-            buffer,
+            BytesIO(contenu),
             as_attachment=True,
             download_name=f'rapport_calcul_{calculation.id}.pdf',
             mimetype='application/pdf'
         )
 
+    except Surcharge as e:
+        return reponse_surcharge(e)
     except Exception as e:
         print(f"Erreur génération PDF: {str(e)}")
         return f"Erreur lors de la génération du PDF: {str(e)}", 500
@@ -557,6 +1349,21 @@ def generate_pdf(calculation_id):
 with app.app_context():
     db.create_all()
 
+    # Colonnes ajoutées après la création initiale des tables
+    migrations = [
+        ('calculation', 'tariff_version', 'VARCHAR(20)'),
+        ('user', 'history_version', 'INTEGER NOT NULL DEFAULT 0')
+    ]
+    for table, colonne, definition in migrations:
+        colonnes = [c['name'] for c in db.inspect(db.engine).get_columns(table)]
+        if colonne not in colonnes:
+            db.session.execute(db.text(f'ALTER TABLE "{table}" ADD COLUMN {colonne} {definition}'))
+    db.session.execute(db.text('CREATE INDEX IF NOT EXISTS ix_calculation_tariff_version '
+                               'ON calculation (tariff_version)'))
+    db.session.commit()
+
+    enregistrer_version_tarif()
+
     # Créer un utilisateur admin par défaut si nécessaire
     if not User.query.filter_by(username='admin').first():
         admin = User(
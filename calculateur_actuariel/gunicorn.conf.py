@@ -0,0 +1,50 @@
+# Configuration de production : gunicorn -c gunicorn.conf.py wsgi:application
+#
+# L'application et les tables de tarification sont chargées dans le processus
+# maître (preload_app), puis partagées en copie sur écriture par les workers.
+# Le maître ne recharge jamais ce code : kill -HUP relance les workers mais
+# ils repartent de l'application déjà chargée. Après une modification du code
+# ou des tarifs (models/pricing_tables.py), redémarrer complètement, ou sans
+# coupure : kill -USR2 <pid du maître> (nouveau maître qui recharge tout), puis
+# kill -WINCH et kill -QUIT <pid de l'ancien maître>.
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('CALCULATEUR_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('CALCULATEUR_WORKERS', multiprocessing.cpu_count()))
+# Workers à threads : les requêtes identiques simultanées d'un worker partagent
+# un seul calcul, et les PDF n'occupent jamais plus de la moitié des threads
+worker_class = 'gthread'
+threads = int(os.environ.get('CALCULATEUR_THREADS', 4))
+preload_app = True
+
+# Recyclage des workers après N requêtes (avec gigue pour éviter les redémarrages simultanés)
+max_requests = int(os.environ.get('CALCULATEUR_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('CALCULATEUR_MAX_REQUESTS_JITTER', 200))
+
+timeout = int(os.environ.get('CALCULATEUR_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('CALCULATEUR_GRACEFUL_TIMEOUT', 30))
+
+accesslog = os.environ.get('CALCULATEUR_ACCESS_LOG', '-')
+errorlog = os.environ.get('CALCULATEUR_ERROR_LOG', '-')
+
+
+def when_ready(server):
+    # Sortir les objets préchargés du ramasse-miettes : ses passages
+    # toucheraient les pages partagées et forceraient leur copie dans chaque worker
+    gc.freeze()
+    server.log.info(f"Tables préchargées, démarrage de {workers} workers")
+
+
+def post_fork(server, worker):
+    # Chaque worker ouvre ses propres connexions SQLite
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose()
+
+
+def worker_exit(server, worker):
+    # Les statistiques de profilage du worker (recyclé ou arrêté) rejoignent le cumul des workers terminés
+    from app import profileur
+    profileur.retirer()
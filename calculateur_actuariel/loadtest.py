@@ -0,0 +1,272 @@
+# Banc de charge des routes principales
+#
+#   python loadtest.py --concurrence 1,4,16 --duree 10           (client de test Flask)
+#   python loadtest.py --url http://127.0.0.1:8000 --concurrence 8
+#
+# Chaque utilisateur virtuel crée son compte puis enchaîne calculs, historique,
+# détails et PDF selon un mélange pondéré ; le rapport donne le débit et les
+# latences p50/p95/p99 par route pour chaque niveau de concurrence.
+# Dans le processus, l'application travaille sur une base temporaire
+# (CALCULATEUR_INSTANCE), supprimée à la fin : instance/ n'est pas modifiée.
+import argparse
+import contextlib
+import http.cookiejar
+import json
+import math
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+
+# Part de chaque route dans le trafic simulé
+MELANGE = {
+    'calculate': 0.60,
+    'history': 0.20,
+    'calculation_details': 0.15,
+    'generate_pdf': 0.05
+}
+
+
+class ClientFlask:
+    """Requêtes dans le processus, via le client de test Flask"""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def requete(self, methode, chemin, json_data=None, form=None):
+        response = self.client.open(chemin, method=methode, json=json_data, data=form)
+        return response.status_code, response.get_data()
+
+
+class ClientHTTP:
+    """Requêtes vers un serveur lancé à part (gunicorn, app.run)"""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def requete(self, methode, chemin, json_data=None, form=None):
+        donnees, entetes = None, {}
+        if json_data is not None:
+            donnees = json.dumps(json_data).encode('utf-8')
+            entetes['Content-Type'] = 'application/json'
+        elif form is not None:
+            donnees = urllib.parse.urlencode(form).encode('utf-8')
+        requete = urllib.request.Request(self.url + chemin, data=donnees, headers=entetes, method=methode)
+        try:
+            with self.opener.open(requete, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def parametres_aleatoires(rng):
+    """Paramètres couvrant toutes les branches et tous les types de contrat"""
+    branche = rng.choice(['Assurance Vie', 'Assurance Non-Vie', 'Assurance Obligatoire'])
+    if branche == 'Assurance Vie':
+        parametres = {
+            'coverageType': rng.choice(['deces', 'vie_entiere', 'rente']),
+            'coverageAmount': str(rng.choice([10000, 50000, 100000, 250000, 1000000])),
+            'age': str(rng.randint(18, 80)),
+            'term': str(rng.randint(5, 40)),
+            'interestRate': str(round(rng.uniform(0.1, 5.0), 1)),
+            'smokingStatus': rng.random() < 0.2,
+            'highRisk': rng.random() < 0.1,
+            'hypertension': rng.random() < 0.15,
+            'diabetes': rng.random() < 0.08,
+            'heart_disease': rng.random() < 0.05
+        }
+        if rng.random() < 0.2:
+            parametres['jointType'] = rng.choice(['premier_deces', 'dernier_survivant'])
+            parametres['secondAge'] = str(rng.randint(18, 80))
+    elif branche == 'Assurance Non-Vie':
+        parametres = {
+            'coverageType': rng.choice(['auto', 'home', 'accident', 'liability']),
+            'coverageAmount': str(rng.choice([5000, 20000, 50000, 300000])),
+            'riskLevel': rng.choice(['0.8', '1.0', '1.3', '1.6']),
+            'guaranteeLevel': rng.choice(['1.0', '1.2', '1.5']),
+            'accident': rng.random() < 0.3,
+            'theft': rng.random() < 0.3,
+            'natural_disaster': rng.random() < 0.2
+        }
+    else:
+        parametres = {
+            'coverageType': rng.choice(['auto_liability', 'health', 'professional', 'home']),
+            'coverageAmount': str(rng.choice([5000, 20000, 80000])),
+            'riskCategory': rng.choice(['0.8', '1.0', '1.5']),
+            'region': rng.choice(['0.9', '1.0', '1.2'])
+        }
+    return branche, parametres
+
+
+class UtilisateurVirtuel:
+    def __init__(self, client, rng):
+        self.client = client
+        self.rng = rng
+        self.calculation_ids = []
+
+    def connecter(self):
+        nom = f'charge_{uuid.uuid4().hex[:12]}'
+        self.client.requete('POST', '/register', form={'username': nom, 'password': nom})
+
+    def executer(self, route):
+        """Exécute une requête et retourne son code HTTP"""
+        if route in ('calculation_details', 'generate_pdf') and not self.calculation_ids:
+            route = 'calculate'
+
+        if route == 'calculate':
+            branche, parametres = parametres_aleatoires(self.rng)
+            statut, corps = self.client.requete('POST', '/calculate',
+                                                json_data={'type': branche, 'parameters': parametres})
+            if statut == 200:
+                self.calculation_ids.append(json.loads(corps)['calculation_id'])
+        elif route == 'history':
+            statut, _ = self.client.requete('GET', '/history')
+        else:
+            calculation_id = self.rng.choice(self.calculation_ids)
+            statut, _ = self.client.requete('GET', f'/{route}/{calculation_id}')
+        return route, statut
+
+
+def percentile(valeurs, p):
+    """Percentile au rang le plus proche (valeurs triées)"""
+    if not valeurs:
+        return 0.0
+    rang = max(1, math.ceil(p / 100 * len(valeurs)))
+    return valeurs[rang - 1]
+
+
+def executer_palier(fabrique_client, concurrence, duree, graine):
+    """Lance `concurrence` utilisateurs pendant `duree` secondes"""
+    latences = {route: [] for route in MELANGE}
+    erreurs = {route: 0 for route in MELANGE}
+    verrou = threading.Lock()
+    routes, poids = list(MELANGE), list(MELANGE.values())
+
+    # Le chronomètre ne démarre qu'une fois tous les utilisateurs connectés
+    pret = threading.Barrier(concurrence + 1)
+
+    def boucle(numero):
+        rng = random.Random(graine * 1000 + numero)
+        utilisateur = UtilisateurVirtuel(fabrique_client(), rng)
+        try:
+            utilisateur.connecter()
+        finally:
+            pret.wait()
+        fin = time.perf_counter() + duree
+        while time.perf_counter() < fin:
+            debut = time.perf_counter()
+            route, statut = utilisateur.executer(rng.choices(routes, poids)[0])
+            ecoule = time.perf_counter() - debut
+            with verrou:
+                latences[route].append(ecoule)
+                if statut >= 400:
+                    erreurs[route] += 1
+
+    threads = [threading.Thread(target=boucle, args=(numero,)) for numero in range(concurrence)]
+    for thread in threads:
+        thread.start()
+    pret.wait()
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    ecoule = time.perf_counter() - debut
+
+    routes_rapport = {}
+    for route, valeurs in latences.items():
+        valeurs.sort()
+        routes_rapport[route] = {
+            'requetes': len(valeurs),
+            'erreurs': erreurs[route],
+            'debit': len(valeurs) / ecoule,
+            'p50_ms': percentile(valeurs, 50) * 1000,
+            'p95_ms': percentile(valeurs, 95) * 1000,
+            'p99_ms': percentile(valeurs, 99) * 1000
+        }
+    toutes = sorted(v for valeurs in latences.values() for v in valeurs)
+    return {
+        'concurrence': concurrence,
+        'duree': ecoule,
+        'requetes': len(toutes),
+        'debit': len(toutes) / ecoule,
+        'p50_ms': percentile(toutes, 50) * 1000,
+        'p95_ms': percentile(toutes, 95) * 1000,
+        'p99_ms': percentile(toutes, 99) * 1000,
+        'routes': routes_rapport
+    }
+
+
+def afficher_palier(palier):
+    print(f"\nConcurrence {palier['concurrence']} - {palier['requetes']} requêtes en "
+          f"{palier['duree']:.1f} s - {palier['debit']:.1f} req/s")
+    print(f"{'Route':<22}{'Requêtes':>10}{'Erreurs':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for route, stats in palier['routes'].items():
+        print(f"{route:<22}{stats['requetes']:>10}{stats['erreurs']:>9}{stats['debit']:>9.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}")
+
+
+def afficher_saturation(paliers):
+    print("\nCourbe de saturation")
+    print(f"{'Concurrence':>12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for palier in paliers:
+        print(f"{palier['concurrence']:>12}{palier['debit']:>10.1f}{palier['p50_ms']:>10.1f}"
+              f"{palier['p95_ms']:>10.1f}{palier['p99_ms']:>10.1f}")
+
+
+def executer_paliers(fabrique_client, args):
+    paliers = []
+    for concurrence in [int(valeur) for valeur in args.concurrence.split(',')]:
+        # Les traces de l'application fausseraient les mesures dans le processus
+        with open(os.devnull, 'w') as muet, \
+                (contextlib.nullcontext() if args.verbeux or args.url else contextlib.redirect_stdout(muet)):
+            palier = executer_palier(fabrique_client, concurrence, args.duree, args.graine)
+        afficher_palier(palier)
+        paliers.append(palier)
+    return paliers
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banc de charge du calculateur actuariel')
+    parser.add_argument('--url', help='Serveur à tester (par défaut : client de test Flask dans le processus)')
+    parser.add_argument('--concurrence', default='1,2,4,8',
+                        help='Niveaux de concurrence, séparés par des virgules')
+    parser.add_argument('--duree', type=float, default=10.0, help='Durée de chaque palier (s)')
+    parser.add_argument('--graine', type=int, default=1, help='Graine du générateur de paramètres')
+    parser.add_argument('--json', dest='fichier_json', help='Écrit aussi le rapport dans ce fichier')
+    parser.add_argument('--verbeux', action='store_true', help='Garde les traces de calcul de l\'application')
+    args = parser.parse_args()
+
+    dossier_temporaire = None
+    if args.url:
+        fabrique_client = lambda: ClientHTTP(args.url)
+    else:
+        dossier_temporaire = tempfile.mkdtemp(prefix='loadtest-')
+        os.environ['CALCULATEUR_INSTANCE'] = dossier_temporaire
+        with open(os.devnull, 'w') as muet, \
+                (contextlib.nullcontext() if args.verbeux else contextlib.redirect_stdout(muet)):
+            import app  # noqa: F401 (initialisation de la base hors des mesures)
+        fabrique_client = ClientFlask
+
+    try:
+        paliers = executer_paliers(fabrique_client, args)
+    finally:
+        if dossier_temporaire:
+            shutil.rmtree(dossier_temporaire, ignore_errors=True)
+
+    afficher_saturation(paliers)
+    if args.fichier_json:
+        with open(args.fichier_json, 'w', encoding='utf-8') as fichier:
+            json.dump(paliers, fichier, indent=2)
+
+
+if __name__ == '__main__':
+    main()
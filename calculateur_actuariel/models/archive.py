@@ -0,0 +1,177 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+
+class CalculArchive:
+    """Calcul relu depuis l'archive (mêmes attributs que le modèle Calculation)"""
+
+    archive = True
+
+    def __init__(self, id, type, amount, date, user_id, tariff_version=None, parameters=None):
+        self.id = id
+        self.type = type
+        self.amount = amount
+        self.date = date if isinstance(date, datetime) else datetime.fromisoformat(date)
+        self.user_id = user_id
+        self.tariff_version = tariff_version
+        self.parameters = parameters
+
+
+class ArchiveCalculs:
+    """Archive compressée des anciens calculs.
+
+    Les calculs plus anciens qu'un âge donné quittent la table calculation
+    pour des fichiers calculs-AAAA-MM.jsonl.gz, un par mois, auxquels on ne
+    fait qu'ajouter : chaque lot archivé y est un membre gzip indépendant.
+    La table calculation_archive garde l'index (id, utilisateur, date) et la
+    position du membre, sans les paramètres JSON.
+    """
+
+    # Membres décompressés gardés en mémoire pour les relectures rapprochées
+    MEMBRES_EN_CACHE = 32
+
+    def __init__(self, db_name, dossier):
+        self.db_name = db_name
+        self.dossier = dossier
+        self._membres = OrderedDict()
+        self._verrou = threading.Lock()
+        os.makedirs(self.dossier, exist_ok=True)
+        self.init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_db(self):
+        conn = self._connect()
+        conn.execute('''
+                     CREATE TABLE IF NOT EXISTS calculation_archive
+                     (
+                         id INTEGER PRIMARY KEY,
+                         user_id INTEGER NOT NULL,
+                         type TEXT NOT NULL,
+                         amount REAL NOT NULL,
+                         date DATETIME NOT NULL,
+                         tariff_version TEXT,
+                         partition TEXT NOT NULL,
+                         position INTEGER NOT NULL,
+                         longueur INTEGER NOT NULL
+                     )
+                     ''')
+        conn.execute('''CREATE INDEX IF NOT EXISTS idx_calculation_archive_user
+                        ON calculation_archive (user_id, date)''')
+        conn.close()
+
+    def _ajouter_membre(self, partition, lignes):
+        """Ajoute un membre gzip en fin de fichier ; retourne (position, longueur)"""
+        contenu = gzip.compress(''.join(json.dumps(ligne) + '\n' for ligne in lignes).encode('utf-8'))
+        with open(os.path.join(self.dossier, f'calculs-{partition}.jsonl.gz'), 'ab') as fichier:
+            position = fichier.tell()
+            fichier.write(contenu)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        return position, len(contenu)
+
+    def archiver(self, avant, taille_bloc=1000, rapporter=lambda progression: None):
+        """Archive les calculs antérieurs à `avant` (datetime), par lots.
+
+        Chaque lot est d'abord écrit et synchronisé sur disque, puis indexé et
+        supprimé de la table calculation dans une même transaction : un arrêt
+        entre les deux laisse au pire un membre orphelin, jamais une perte.
+        Le calcul d'id le plus élevé reste toujours dans la table : sans
+        AUTOINCREMENT, SQLite réutiliserait sinon des id déjà archivés.
+        Retourne le nombre de calculs archivés.
+        """
+        limite = avant.strftime('%Y-%m-%d %H:%M:%S.%f')
+        archives = 0
+        conn = self._connect()
+        try:
+            id_max = conn.execute('SELECT MAX(id) FROM calculation').fetchone()[0] or 0
+            total = conn.execute('SELECT COUNT(*) FROM calculation WHERE date < ? AND id < ?',
+                                 (limite, id_max)).fetchone()[0]
+            while True:
+                lignes = [dict(ligne) for ligne in conn.execute('''
+                          SELECT id, type, amount, parameters, date, user_id, tariff_version
+                          FROM calculation WHERE date < ? AND id < ? ORDER BY id LIMIT ?
+                          ''', (limite, id_max, taille_bloc))]
+                if not lignes:
+                    break
+
+                partitions = {}
+                for ligne in lignes:
+                    partitions.setdefault(ligne['date'][:7], []).append(ligne)
+
+                index = []
+                for partition, membre in partitions.items():
+                    position, longueur = self._ajouter_membre(partition, membre)
+                    index.extend((ligne['id'], ligne['user_id'], ligne['type'], ligne['amount'], ligne['date'],
+                                  ligne['tariff_version'], partition, position, longueur) for ligne in membre)
+
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    conn.executemany('''
+                                     INSERT INTO calculation_archive
+                                         (id, user_id, type, amount, date, tariff_version, partition, position, longueur)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                     ''', index)
+                    conn.executemany('DELETE FROM calculation WHERE id = ?', [(ligne['id'],) for ligne in lignes])
+                    conn.execute('COMMIT')
+                except Exception:
+                    conn.execute('ROLLBACK')
+                    raise
+
+                archives += len(lignes)
+                print(f"🗄️ {archives} calculs archivés ({', '.join(sorted(partitions))})")
+                rapporter(min(1.0, archives / total))
+        finally:
+            conn.close()
+        return archives
+
+    def _lire_membre(self, partition, position, longueur):
+        cle = (partition, position)
+        with self._verrou:
+            membre = self._membres.get(cle)
+            if membre is not None:
+                self._membres.move_to_end(cle)
+                return membre
+
+        with open(os.path.join(self.dossier, f'calculs-{partition}.jsonl.gz'), 'rb') as fichier:
+            fichier.seek(position)
+            contenu = gzip.decompress(fichier.read(longueur))
+        membre = {}
+        for texte in contenu.decode('utf-8').splitlines():
+            ligne = json.loads(texte)
+            membre[ligne['id']] = ligne
+
+        with self._verrou:
+            self._membres[cle] = membre
+            while len(self._membres) > self.MEMBRES_EN_CACHE:
+                self._membres.popitem(last=False)
+        return membre
+
+    def get(self, calculation_id):
+        """Calcul archivé complet (avec ses paramètres), ou None"""
+        conn = self._connect()
+        entree = conn.execute('SELECT partition, position, longueur FROM calculation_archive WHERE id = ?',
+                              (calculation_id,)).fetchone()
+        conn.close()
+        if entree is None:
+            return None
+        ligne = self._lire_membre(entree['partition'], entree['position'], entree['longueur'])[calculation_id]
+        return CalculArchive(**ligne)
+
+    def lister(self, user_id):
+        """Calculs archivés d'un utilisateur, du plus récent au plus ancien (sans paramètres)"""
+        conn = self._connect()
+        lignes = conn.execute('''
+                              SELECT id, type, amount, date, user_id, tariff_version
+                              FROM calculation_archive WHERE user_id = ? ORDER BY date DESC
+                              ''', (user_id,)).fetchall()
+        conn.close()
+        return [CalculArchive(**dict(ligne)) for ligne in lignes]
@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : limites propres à chaque processus
+    fcntl = None
+
+
+class Surcharge(Exception):
+    """Requête refusée par le contrôle d'admission (réponse 429)"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Appel:
+    def __init__(self):
+        self.termine = threading.Event()
+        self.resultat = None
+        self.exception = None
+
+
+class SingleFlight:
+    """Regroupe les appels identiques simultanés en un seul calcul.
+
+    Le premier appel pour une clé exécute la fonction ; les appels qui
+    arrivent pendant ce temps attendent et reçoivent le même résultat
+    (ou la même exception).
+    """
+
+    def __init__(self):
+        self._appels = {}
+        self._verrou = threading.Lock()
+
+    def executer(self, cle, fonction):
+        with self._verrou:
+            appel = self._appels.get(cle)
+            meneur = appel is None
+            if meneur:
+                appel = self._appels[cle] = _Appel()
+
+        if not meneur:
+            appel.termine.wait()
+            if appel.exception is not None:
+                raise appel.exception
+            return appel.resultat
+
+        try:
+            appel.resultat = fonction()
+            return appel.resultat
+        except BaseException as e:
+            appel.exception = e
+            raise
+        finally:
+            with self._verrou:
+                del self._appels[cle]
+            appel.termine.set()
+
+
+class AdmissionControl:
+    """Limite le nombre de traitements simultanés, globalement et par utilisateur.
+
+    Chaque place est un octet verrouillé (fcntl.lockf) du fichier
+    `dossier`/`nom`.lock : les octets 0 à max_global - 1 pour la limite
+    globale, puis max_par_utilisateur octets par utilisateur. Les limites
+    valent pour tous les workers gunicorn, le fichier ne grossit pas avec
+    le nombre d'utilisateurs et une place est rendue automatiquement si un
+    worker meurt. Sans fcntl (Windows), elles ne valent que par processus.
+    max_processus borne les requêtes de ce type (en cours ou en attente)
+    dans un même worker, pour lui laisser des threads libres.
+    Au-delà de max_global, une requête attend au plus attente_max secondes ;
+    quota utilisateur ou processus atteint, ou attente dépassée, lèvent Surcharge.
+    """
+
+    INTERVALLE_ATTENTE = 0.01
+
+    def __init__(self, nom, dossier, max_global, max_par_utilisateur, max_processus, attente_max):
+        self.nom = nom
+        self.dossier = dossier
+        self.max_global = max_global
+        self.max_par_utilisateur = max_par_utilisateur
+        self.max_processus = max_processus
+        self.attente_max = attente_max
+        self.locaux = 0
+        self._verrou = threading.Lock()
+        # Octets tenus par les threads de ce processus : les verrous POSIX
+        # appartiennent au processus et ne départagent pas ses threads
+        self._occupees = set()
+        self._fd = None
+        if fcntl is not None:
+            os.makedirs(self.dossier, exist_ok=True)
+            # Jamais fermé : fermer un descripteur du fichier libérerait tous les verrous du processus
+            self._fd = os.open(os.path.join(self.dossier, f'{nom}.lock'), os.O_CREAT | os.O_RDWR, 0o600)
+
+    def _prendre_place(self, debut, nombre):
+        """Position d'une place libre parmi `nombre` à partir de `debut`, ou None"""
+        with self._verrou:
+            for position in range(debut, debut + nombre):
+                if position in self._occupees:
+                    continue
+                if self._fd is not None:
+                    try:
+                        fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, position)
+                    except OSError:
+                        continue
+                self._occupees.add(position)
+                return position
+        return None
+
+    def _rendre_place(self, position):
+        with self._verrou:
+            if self._fd is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, position)
+            self._occupees.discard(position)
+
+    @contextmanager
+    def admettre(self, user_id):
+        with self._verrou:
+            if self.locaux >= self.max_processus:
+                raise Surcharge(f'Serveur occupé ({self.nom})')
+            self.locaux += 1
+        try:
+            debut_utilisateur = self.max_global + int(user_id) * self.max_par_utilisateur
+            place_utilisateur = self._prendre_place(debut_utilisateur, self.max_par_utilisateur)
+            if place_utilisateur is None:
+                raise Surcharge(f'Trop de requêtes {self.nom} simultanées pour cet utilisateur')
+            try:
+                place = self._prendre_place(0, self.max_global)
+                limite = time.monotonic() + self.attente_max
+                while place is None:
+                    if time.monotonic() >= limite:
+                        raise Surcharge(f'Serveur occupé ({self.nom})', retry_after=max(1, int(self.attente_max)))
+                    time.sleep(self.INTERVALLE_ATTENTE)
+                    place = self._prendre_place(0, self.max_global)
+                try:
+                    yield
+                finally:
+                    self._rendre_place(place)
+            finally:
+                self._rendre_place(place_utilisateur)
+        finally:
+            with self._verrou:
+                self.locaux -= 1
@@ -0,0 +1,47 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    """Cache LRU de fragments HTML rendus, borné en entrées et en taille.
+
+    Chaque entrée porte la version des données qui l'ont produite : une
+    lecture avec une autre version est un défaut de cache, l'entrée est
+    alors remplacée au prochain set().
+    """
+
+    def __init__(self, max_entrees=1000, max_taille=32 * 1024 * 1024):
+        self.max_entrees = max_entrees
+        self.max_taille = max_taille
+        self.taille = 0
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+
+    def get(self, cle, version):
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is None or entree[0] != version:
+                return None
+            self._entrees.move_to_end(cle)
+            return entree[1]
+
+    def set(self, cle, version, fragment):
+        taille = len(fragment)
+        if taille > self.max_taille:
+            return
+        with self._verrou:
+            self._retirer(cle)
+            self._entrees[cle] = (version, fragment)
+            self.taille += taille
+            # Éviction des entrées les moins récemment lues
+            while len(self._entrees) > self.max_entrees or self.taille > self.max_taille:
+                self._retirer(next(iter(self._entrees)))
+
+    def invalider(self, cle):
+        with self._verrou:
+            self._retirer(cle)
+
+    def _retirer(self, cle):
+        entree = self._entrees.pop(cle, None)
+        if entree is not None:
+            self.taille -= len(entree[1])
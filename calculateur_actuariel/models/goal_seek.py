@@ -0,0 +1,48 @@
+import numpy as np
+
+
+def resoudre_continu(evaluer, cible, borne_basse, borne_haute, points=64, tolerance=0.01, iterations_max=30):
+    """Plus grande valeur x de [borne_basse, borne_haute] telle que evaluer(x) <= cible.
+
+    evaluer reçoit un tableau de candidats et doit être croissante. Chaque
+    itération évalue `points` candidats en un seul appel et resserre
+    l'encadrement autour du premier dépassement de la cible.
+    Retourne (valeur ou None, nombre d'évaluations).
+    """
+    bornes = np.array([borne_basse, borne_haute], dtype=float)
+    prime_basse, prime_haute = evaluer(bornes)
+    evaluations = 2
+    if prime_basse > cible:
+        return None, evaluations
+    if prime_haute <= cible:
+        return float(borne_haute), evaluations
+
+    a, b = float(borne_basse), float(borne_haute)
+    for _ in range(iterations_max):
+        if b - a <= tolerance:
+            break
+        candidats = np.linspace(a, b, points)
+        primes = evaluer(candidats)
+        evaluations += points
+        # candidats[0] respecte la cible et candidats[-1] la dépasse
+        k = int(np.argmax(primes > cible))
+        a, b = float(candidats[k - 1]), float(candidats[k])
+    return a, evaluations
+
+
+def resoudre_discret(evaluer, cible, valeurs):
+    """Plus grande valeur entière dont la prime ne dépasse pas la cible.
+
+    Toutes les valeurs sont évaluées en un seul appel ; la prime peut être
+    croissante, décroissante (rente selon l'âge) ou plate (prime minimale).
+    Retourne (valeur, prime, (min, max) des valeurs admissibles), ou None si
+    aucune valeur ne respecte la cible.
+    """
+    valeurs = np.asarray(valeurs)
+    primes = evaluer(valeurs)
+    admissibles = primes <= cible
+    if not admissibles.any():
+        return None
+    retenues = valeurs[admissibles]
+    k = int(np.flatnonzero(admissibles)[np.argmax(retenues)])
+    return int(valeurs[k]), float(primes[k]), (int(retenues.min()), int(retenues.max()))
@@ -0,0 +1,237 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+
+
+class JobAnnule(Exception):
+    """Levée dans une tâche dont l'annulation a été demandée"""
+
+
+class JobQueue:
+    """File de tâches longues persistée dans SQLite.
+
+    Les tâches survivent au redémarrage du serveur web : les workers
+    (voir worker.py) réclament les tâches en attente, publient leur
+    progression et écrivent le résultat dans un fichier sur disque.
+    """
+
+    # Au-delà de ce délai sans signe de vie, une tâche en cours est remise en attente
+    DELAI_BLOCAGE = 300
+    TENTATIVES_MAX = 3
+    # Signe de vie envoyé pendant toute l'exécution, même entre deux progressions
+    INTERVALLE_BATTEMENT = 30
+
+    def __init__(self, db_name, dossier_resultats):
+        self.db_name = db_name
+        self.dossier_resultats = dossier_resultats
+        self.taches = {}
+        os.makedirs(self.dossier_resultats, exist_ok=True)
+        self.init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_name, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_db(self):
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+                     CREATE TABLE IF NOT EXISTS jobs
+                     (
+                         id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         user_id INTEGER,
+                         type TEXT NOT NULL,
+                         parametres TEXT NOT NULL,
+                         statut TEXT NOT NULL DEFAULT 'en_attente',
+                         progression REAL NOT NULL DEFAULT 0,
+                         annulation_demandee INTEGER NOT NULL DEFAULT 0,
+                         tentatives INTEGER NOT NULL DEFAULT 0,
+                         worker TEXT,
+                         erreur TEXT,
+                         chemin_resultat TEXT,
+                         created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                         started_at DATETIME,
+                         finished_at DATETIME,
+                         heartbeat REAL
+                     )
+                     ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_statut ON jobs (statut, id)')
+        conn.close()
+
+    def tache(self, nom):
+        """Décorateur enregistrant une fonction tache(parametres, rapporter)"""
+        def enregistrer(fonction):
+            self.taches[nom] = fonction
+            return fonction
+        return enregistrer
+
+    def soumettre(self, type_job, parametres, user_id=None):
+        if type_job not in self.taches:
+            raise ValueError(f'Type de tâche inconnu: {type_job}')
+
+        conn = self._connect()
+        cursor = conn.execute('''
+                              INSERT INTO jobs (user_id, type, parametres)
+                              VALUES (?, ?, ?)
+                              ''', (user_id, type_job, json.dumps(parametres)))
+        conn.close()
+        return cursor.lastrowid
+
+    def get(self, job_id):
+        conn = self._connect()
+        job = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        conn.close()
+        return dict(job) if job else None
+
+    def annuler(self, job_id):
+        """Annule une tâche en attente, ou demande l'arrêt d'une tâche en cours"""
+        conn = self._connect()
+        conn.execute('''
+                     UPDATE jobs SET statut = 'annule', finished_at = CURRENT_TIMESTAMP
+                     WHERE id = ? AND statut = 'en_attente'
+                     ''', (job_id,))
+        conn.execute('''
+                     UPDATE jobs SET annulation_demandee = 1
+                     WHERE id = ? AND statut = 'en_cours'
+                     ''', (job_id,))
+        conn.close()
+
+    def reclamer(self, worker):
+        """Attribue la plus ancienne tâche en attente à ce worker"""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            job = conn.execute('''
+                               SELECT * FROM jobs WHERE statut = 'en_attente'
+                               ORDER BY id LIMIT 1
+                               ''').fetchone()
+            if job is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('''
+                         UPDATE jobs
+                         SET statut = 'en_cours', worker = ?, tentatives = tentatives + 1,
+                             started_at = CURRENT_TIMESTAMP, heartbeat = ?
+                         WHERE id = ?
+                         ''', (worker, time.time(), job['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+        return dict(job, statut='en_cours', worker=worker)
+
+    def rapporter(self, job_id, worker, progression):
+        """Met à jour la progression (0 à 1).
+
+        Lève JobAnnule si l'arrêt est demandé, ou si la tâche a été remise
+        en attente et n'appartient plus à ce worker.
+        """
+        conn = self._connect()
+        cursor = conn.execute('''
+                              UPDATE jobs SET progression = ?, heartbeat = ?
+                              WHERE id = ? AND worker = ? AND statut = 'en_cours'
+                              ''', (progression, time.time(), job_id, worker))
+        annule = conn.execute('SELECT annulation_demandee FROM jobs WHERE id = ?',
+                              (job_id,)).fetchone()[0]
+        conn.close()
+        if annule or cursor.rowcount == 0:
+            raise JobAnnule()
+
+    def battre(self, job_id, worker):
+        """Signe de vie d'une tâche en cours, tant qu'elle appartient à ce worker"""
+        conn = self._connect()
+        conn.execute('''
+                     UPDATE jobs SET heartbeat = ?
+                     WHERE id = ? AND worker = ? AND statut = 'en_cours'
+                     ''', (time.time(), job_id, worker))
+        conn.close()
+
+    def _battre_en_continu(self, job_id, worker, arret):
+        while not arret.wait(self.INTERVALLE_BATTEMENT):
+            try:
+                self.battre(job_id, worker)
+            except sqlite3.Error as e:
+                print(f"⚠️ Signe de vie de la tâche {job_id} non enregistré: {str(e)}")
+
+    def _finir(self, job_id, worker, statut, erreur=None, chemin_resultat=None):
+        """Enregistre l'issue d'une tâche ; sans effet si elle a été reprise par un autre worker"""
+        conn = self._connect()
+        cursor = conn.execute('''
+                              UPDATE jobs
+                              SET statut = ?, erreur = ?, chemin_resultat = ?, finished_at = CURRENT_TIMESTAMP,
+                                  progression = CASE WHEN ? = 'termine' THEN 1 ELSE progression END
+                              WHERE id = ? AND worker = ? AND statut = 'en_cours'
+                              ''', (statut, erreur, chemin_resultat, statut, job_id, worker))
+        conn.close()
+        if cursor.rowcount == 0:
+            print(f"⚠️ Tâche {job_id} reprise par un autre worker, issue ignorée ({statut})")
+        return cursor.rowcount == 1
+
+    def remettre_en_attente_bloques(self):
+        """Relance les tâches dont le worker a disparu (arrêt brutal, redémarrage)"""
+        limite = time.time() - self.DELAI_BLOCAGE
+        conn = self._connect()
+        conn.execute('''
+                     UPDATE jobs SET statut = 'echec', erreur = 'Nombre maximal de tentatives atteint',
+                                     finished_at = CURRENT_TIMESTAMP
+                     WHERE statut = 'en_cours' AND heartbeat < ? AND tentatives >= ?
+                     ''', (limite, self.TENTATIVES_MAX))
+        cursor = conn.execute('''
+                              UPDATE jobs SET statut = 'en_attente', worker = NULL
+                              WHERE statut = 'en_cours' AND heartbeat < ?
+                              ''', (limite,))
+        conn.close()
+        return cursor.rowcount
+
+    def executer(self, job):
+        """Exécute une tâche réclamée et enregistre son issue.
+
+        Un thread envoie un signe de vie toutes les INTERVALLE_BATTEMENT
+        secondes : une tâche longue entre deux progressions n'est pas prise
+        pour bloquée ni relancée par un autre worker.
+        """
+        job_id, worker = job['id'], job['worker']
+        arret = threading.Event()
+        battement = threading.Thread(target=self._battre_en_continu, args=(job_id, worker, arret), daemon=True)
+        battement.start()
+        try:
+            resultat = self.taches[job['type']](json.loads(job['parametres']),
+                                                lambda progression: self.rapporter(job_id, worker, progression))
+        except JobAnnule:
+            self._finir(job_id, worker, 'annule')
+            return
+        except Exception as e:
+            print(f"❌ Erreur tâche {job_id}: {str(e)}")
+            traceback.print_exc()
+            self._finir(job_id, worker, 'echec', erreur=str(e))
+            return
+        finally:
+            arret.set()
+            battement.join()
+
+        chemin = os.path.join(self.dossier_resultats, f'job_{job_id}.json')
+        temporaire = f'{chemin}.{worker}.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(resultat, fichier)
+        os.replace(temporaire, chemin)
+        self._finir(job_id, worker, 'termine', chemin_resultat=chemin)
+
+    def boucle_worker(self, worker, attente=1.0, arret=lambda: False):
+        """Réclame et exécute des tâches jusqu'à ce que arret() soit vrai"""
+        print(f"👷 Worker {worker} démarré")
+        self.remettre_en_attente_bloques()
+        while not arret():
+            job = self.reclamer(worker)
+            if job is None:
+                self.remettre_en_attente_bloques()
+                time.sleep(attente)
+                continue
+            print(f"👷 Worker {worker} - tâche {job['id']} ({job['type']})")
+            self.executer(job)
+        print(f"👷 Worker {worker} arrêté")
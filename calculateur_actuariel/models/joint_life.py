@@ -0,0 +1,103 @@
+from functools import lru_cache
+
+import numpy as np
+
+from .pricing_tables import AGE_MIN, AGE_LIMITE, VECTEUR_SURVIE, TARIFS
+
+
+# Statuts à deux têtes : le contrat s'arrête au premier décès ou au dernier
+STATUTS = ('premier_deces', 'dernier_survivant')
+
+# Nombre d'années projetées depuis 18 ans jusqu'à la fermeture de la table (121 ans)
+_HORIZON = AGE_LIMITE - AGE_MIN + 2
+
+
+def _construire_matrice_survie():
+    """Probabilités de survie t_p_x pour chaque âge entier (une ligne par âge).
+
+    La table est fermée à 120 ans : t_p_x est nul au-delà.
+    """
+    survie = np.asarray(VECTEUR_SURVIE)
+    matrice = np.zeros((len(survie), _HORIZON))
+    for i in range(len(survie)):
+        matrice[i, :len(survie) - i] = survie[i:] / survie[i]
+    return matrice
+
+
+MATRICE_SURVIE = _construire_matrice_survie()
+
+
+@lru_cache(maxsize=128)
+def _actualisation(taux):
+    """Facteurs v^k pour k = 1 .. horizon"""
+    return (1 / (1 + taux / 100)) ** np.arange(1, _HORIZON)
+
+
+def survie_statut(ages1, ages2, statuts):
+    """Survie du statut à deux têtes, un contrat par ligne.
+
+    premier_deces : t_p_xy = t_p_x * t_p_y
+    dernier_survivant : t_p_x + t_p_y - t_p_xy
+    """
+    s1 = MATRICE_SURVIE[np.asarray(ages1, dtype=int) - AGE_MIN]
+    s2 = MATRICE_SURVIE[np.asarray(ages2, dtype=int) - AGE_MIN]
+    produit = s1 * s2
+    premier_deces = (np.asarray(statuts) == 'premier_deces')[:, None]
+    return np.where(premier_deces, produit, s1 + s2 - produit)
+
+
+def horizon_statut(ages1, ages2, statuts):
+    """Durée maximale de couverture jusqu'à 120 ans selon le statut"""
+    ages1 = np.asarray(ages1, dtype=int)
+    ages2 = np.asarray(ages2, dtype=int)
+    return np.where(np.asarray(statuts) == 'premier_deces',
+                    AGE_LIMITE - np.maximum(ages1, ages2),
+                    AGE_LIMITE - np.minimum(ages1, ages2))
+
+
+def primes_deux_tetes(capitaux, ages1, ages2, durees, taux, types, statuts, facteurs_risque):
+    """Primes annuelles de contrats à deux têtes (décès temporaire, vie entière, rente).
+
+    Tous les arguments sont des tableaux d'une valeur par contrat ; le taux
+    peut être un scalaire. Mêmes conventions que les contrats sur une tête :
+    le décès temporaire somme les taux de décès du statut q_k = 1 - s_k+1 / s_k
+    actualisés (comme prime_deces_temporaire somme les q_x+k), la vie
+    entière et la rente pondèrent par la survie du statut.
+    """
+    types = np.atleast_1d(np.asarray(types))
+    statuts = np.atleast_1d(np.asarray(statuts))
+    inconnus = set(statuts.tolist()) - set(STATUTS)
+    if inconnus:
+        raise ValueError(f'Statut à deux têtes non reconnu: {", ".join(sorted(inconnus))}')
+    inconnus = set(types.tolist()) - set(TARIFS['vie']['chargements'])
+    if inconnus:
+        raise ValueError(f'Type de contrat non reconnu: {", ".join(sorted(inconnus))}')
+
+    nombre = len(types)
+    taux = np.broadcast_to(np.asarray(taux, dtype=float), (nombre,))
+    s = survie_statut(np.atleast_1d(ages1), np.atleast_1d(ages2), statuts)
+    v = np.stack([_actualisation(float(t)) for t in taux])
+
+    # Statut en vie en début d'année k, décès du statut durant l'année k
+    # (probabilité non conditionnelle pour la vie entière, taux de décès pour le temporaire)
+    vivant = s[:, :-1] * v
+    deces = (s[:, :-1] - s[:, 1:]) * v
+    q = np.divide(s[:, :-1] - s[:, 1:], s[:, :-1], out=np.zeros_like(vivant), where=s[:, :-1] > 0)
+
+    horizon = horizon_statut(np.atleast_1d(ages1), np.atleast_1d(ages2), statuts)
+    couverture = np.where(types == 'deces', np.minimum(np.atleast_1d(durees), horizon), horizon)
+    annees = np.arange(1, _HORIZON)
+    couvert = annees[None, :] <= couverture[:, None]
+
+    valeur = np.select([types == 'rente', types == 'deces'],
+                       [TARIFS['vie']['taux_rente'] * (vivant * couvert).sum(axis=1),
+                        (q * v * couvert).sum(axis=1)],
+                       (deces * couvert).sum(axis=1))
+    chargements = np.array([TARIFS['vie']['chargements'][type_contrat] for type_contrat in types.tolist()])
+    return np.asarray(capitaux, dtype=float) * valeur * np.asarray(facteurs_risque, dtype=float) * chargements
+
+
+def prime_deux_tetes(capital, age1, age2, duree, taux, type_contrat, statut, facteur_risque):
+    """Prime annuelle d'un seul contrat à deux têtes"""
+    return float(primes_deux_tetes([capital], [age1], [age2], [duree], taux,
+                                   [type_contrat], [statut], [facteur_risque])[0])
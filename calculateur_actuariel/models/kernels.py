@@ -0,0 +1,112 @@
+import numpy as np
+
+from .pricing_tables import TABLE_MORTALITE, AGE_MIN, AGE_MAX_TABLE
+
+
+# Backends disponibles : 'python' garde les boucles d'origine, 'numba' les compile
+BACKENDS = ('python', 'numba')
+backend = 'python'
+_noyaux = {}
+
+TABLE_Q = np.array([TABLE_MORTALITE[age] for age in range(AGE_MIN, AGE_MAX_TABLE + 1)])
+
+
+# ===== Noyaux (même source pour l'interprète et pour Numba) =====
+def _deces_temporaire(table_q, capital, age, duree, taux):
+    """Boucle de calculate_prime_deces_temporaire (avant facteur de risque et chargement)"""
+    prime = 0.0
+    taux_interet = taux / 100
+    for annee in range(1, duree + 1):
+        age_actuel = age + annee - 1
+        if age_actuel <= 80:
+            taux_mortalite = table_q[max(18, min(80, int(age_actuel))) - 18]
+        else:
+            taux_mortalite = min(0.25, 0.05 + (age_actuel - 80) * 0.025)
+        prime += capital * taux_mortalite * (1 + taux_interet) ** -annee
+    return prime
+
+
+def _valeur_deces(table_mortalite, age, term, coverage_amount, interest_rate):
+    """Boucle de PremiumCalculator.calculate_life_insurance"""
+    premium = 0.0
+    for t in range(term):
+        age_index = max(0, min(age + t - 18, 59))
+        mortality_rate_t = table_mortalite[age_index] / 1000
+        discount_factor = 1 / ((1 + interest_rate) ** (t + 1))
+        premium += mortality_rate_t * coverage_amount * discount_factor
+    return premium
+
+
+def _facteur_rente(table_mortalite, age, term, interest_rate):
+    """Boucle de calculate_annuity_premium et calculate_annuity_factor"""
+    annuity_factor = 0.0
+    survival_probability = 1.0
+    for t in range(term):
+        if t > 0:
+            age_index = max(0, min(age + t - 1 - 18, 59))
+            survival_probability *= (1 - table_mortalite[age_index] / 1000)
+        discount_factor = 1 / ((1 + interest_rate) ** t)
+        annuity_factor += survival_probability * discount_factor
+    return annuity_factor
+
+
+NOYAUX = {
+    'deces_temporaire': _deces_temporaire,
+    'valeur_deces': _valeur_deces,
+    'facteur_rente': _facteur_rente
+}
+
+
+def _cas_de_parite():
+    """Jeu d'arguments couvrant les âges, durées et taux utilisés par le calculateur"""
+    table_pc = np.linspace(0.001, 1.778, 60)
+    for age in (18, 35, 47, 63, 80):
+        for duree in (1, 5, 20, 40):
+            for taux in (0.1, 1.5, 5.0):
+                yield 'deces_temporaire', (TABLE_Q, 100000.0, age + 0.5, duree, taux)
+                yield 'valeur_deces', (table_pc, age, duree, 100000.0, taux / 100)
+                yield 'facteur_rente', (table_pc, age, duree, taux / 100)
+
+
+def verifier_parite(noyaux, tolerance=1e-12):
+    """Compare des noyaux compilés aux mêmes noyaux interprétés.
+
+    Retourne la liste des écarts (vide si les backends concordent).
+    """
+    ecarts = []
+    for nom, args in _cas_de_parite():
+        attendu = NOYAUX[nom](*args)
+        obtenu = noyaux[nom](*args)
+        if abs(obtenu - attendu) > tolerance * max(1.0, abs(attendu)):
+            ecarts.append((nom, args[1:], attendu, obtenu))
+    return ecarts
+
+
+def selectionner_backend(nom):
+    """Choisit le backend des noyaux au démarrage ; repli sur 'python' en cas d'échec"""
+    global backend, _noyaux
+    if nom not in BACKENDS:
+        raise ValueError(f'Backend de calcul inconnu: {nom}')
+
+    if nom == 'numba':
+        try:
+            import numba
+            noyaux = {cle: numba.njit(cache=True)(noyau) for cle, noyau in NOYAUX.items()}
+            ecarts = verifier_parite(noyaux)
+        except Exception as e:
+            print(f"⚠️ Noyaux Numba indisponibles ({str(e)}), repli sur Python")
+            nom, noyaux = 'python', {}
+        else:
+            if ecarts:
+                print(f"⚠️ Noyaux Numba non conformes ({len(ecarts)} écart(s)), repli sur Python")
+                nom, noyaux = 'python', {}
+    else:
+        noyaux = {}
+
+    backend, _noyaux = nom, noyaux
+    return backend
+
+
+def get_noyau(nom):
+    """Noyau compilé, ou None pour garder le code Python d'origine"""
+    return _noyaux.get(nom)
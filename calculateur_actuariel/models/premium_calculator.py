@@ -1,5 +1,9 @@
 import math
 
+import numpy as np
+
+from . import kernels
+
 
 class PremiumCalculator:
     def __init__(self, age, gender, coverage_type, insurance_branch, coverage_amount,
@@ -70,6 +74,10 @@ class PremiumCalculator:
         else:
             return self.mortality_table['female'][age_index] / 1000
 
+    def get_mortality_table(self):
+        """Table de mortalité du sexe de l'assuré, pour les noyaux compilés"""
+        return np.asarray(self.mortality_table['male' if self.gender == 'male' else 'female'], dtype=float)
+
     def calculate_premium(self):
         """Calculer la prime actuarielle selon la branche d'assurance"""
         if self.insurance_branch == 'vie':
@@ -99,6 +107,12 @@ class PremiumCalculator:
 
     def calculate_life_insurance(self):
         """Calculer la prime pour une assurance vie classique"""
+        noyau = kernels.get_noyau('valeur_deces')
+        if noyau is not None:
+            premium = noyau(self.get_mortality_table(), int(self.age), int(self.term),
+                            float(self.coverage_amount), self.interest_rate)
+            return premium / self.calculate_annuity_factor()
+
         # Probabilité de survie et facteur d'actualisation
         premium = 0
         for t in range(self.term):
@@ -130,6 +144,11 @@ class PremiumCalculator:
 
     def calculate_annuity_premium(self):
         """Calculer la prime pour une rente"""
+        noyau = kernels.get_noyau('facteur_rente')
+        if noyau is not None:
+            return self.coverage_amount * noyau(self.get_mortality_table(), int(self.age), int(self.term),
+                                                self.interest_rate)
+
         # Calcul simplifié d'une rente viagère
         survival_probabilities = 1.0
         annuity_value = 0
@@ -208,6 +227,10 @@ class PremiumCalculator:
 
     def calculate_annuity_factor(self):
         """Calculer le facteur de rente pour le paiement de la prime"""
+        noyau = kernels.get_noyau('facteur_rente')
+        if noyau is not None:
+            return noyau(self.get_mortality_table(), int(self.age), int(self.term), self.interest_rate)
+
         annuity_factor = 0
         survival_probability = 1.0
 
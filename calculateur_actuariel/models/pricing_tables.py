@@ -0,0 +1,245 @@
+import gzip
+import hashlib
+import json
+from functools import lru_cache
+
+import numpy as np
+
+
+# Table de mortalité THP-00/02 (simplifiée), taux annuels q_x par âge
+TABLE_MORTALITE = {
+    18: 0.0005, 19: 0.0005, 20: 0.0006, 21: 0.0006, 22: 0.0007, 23: 0.0007, 24: 0.0008,
+    25: 0.0008, 26: 0.0009, 27: 0.0009, 28: 0.0010, 29: 0.0010, 30: 0.0011,
+    31: 0.0012, 32: 0.0013, 33: 0.0014, 34: 0.0015, 35: 0.0016,
+    36: 0.0017, 37: 0.0019, 38: 0.0020, 39: 0.0022, 40: 0.0024,
+    41: 0.0026, 42: 0.0029, 43: 0.0032, 44: 0.0035, 45: 0.0039,
+    46: 0.0043, 47: 0.0048, 48: 0.0053, 49: 0.0059, 50: 0.0066,
+    51: 0.0074, 52: 0.0083, 53: 0.0093, 54: 0.0104, 55: 0.0117,
+    56: 0.0132, 57: 0.0148, 58: 0.0166, 59: 0.0187, 60: 0.0211,
+    61: 0.0238, 62: 0.0268, 63: 0.0302, 64: 0.0340, 65: 0.0383,
+    66: 0.0431, 67: 0.0485, 68: 0.0546, 69: 0.0614, 70: 0.0690,
+    71: 0.0775, 72: 0.0869, 73: 0.0973, 74: 0.1088, 75: 0.1214,
+    76: 0.1352, 77: 0.1502, 78: 0.1664, 79: 0.1838, 80: 0.2024
+}
+
+AGE_MIN = 18
+AGE_MAX_TABLE = 80
+AGE_LIMITE = 120
+
+# Facteurs de tarification partagés entre le serveur et le calculateur du navigateur
+TARIFS = {
+    'vie': {
+        'facteurs_risque': {
+            'smokingStatus': 1.8,
+            'highRisk': 1.4,
+            'hypertension': 1.3,
+            'diabetes': 1.5,
+            'heart_disease': 2.0
+        },
+        'chargements': {
+            'deces': 1.2,
+            'vie_entiere': 1.15,
+            'rente': 1.15
+        },
+        'taux_rente': 0.08,  # La rente verse 8% du capital par an
+        'prime_minimale': 5.0
+    },
+    'non_vie': {
+        'taux_base': {
+            'auto': 0.02,
+            'home': 0.012,
+            'accident': 0.008
+        },
+        'taux_defaut': 0.015,
+        'garanties': {
+            'accident': 1.2,
+            'theft': 1.15,
+            'natural_disaster': 1.25
+        }
+    },
+    'obligatoire': {
+        'taux_reglementaire': {
+            'auto_liability': 0.015,
+            'health': 0.025,
+            'professional': 0.018
+        },
+        'taux_defaut': 0.02
+    }
+}
+
+# Taux technique publié avec les tables de commutation précalculées
+TAUX_TECHNIQUE_DEFAUT = 1.5
+
+
+def taux_mortalite(age):
+    """Taux de mortalité de la table (âges bornés entre 18 et 80 ans)"""
+    age_arrondi = max(AGE_MIN, min(AGE_MAX_TABLE, int(age)))
+    return TABLE_MORTALITE.get(age_arrondi, 0.05)
+
+
+def taux_mortalite_etendu(age):
+    """Table de mortalité étendue au-delà de 80 ans"""
+    if age <= AGE_MAX_TABLE:
+        return taux_mortalite(age)
+    # Taux de mortalité progressif au-delà de 80 ans
+    return min(0.25, 0.05 + (age - AGE_MAX_TABLE) * 0.025)
+
+
+def _construire_vecteurs_mortalite():
+    """Vecteurs q_x et l_x pour les âges entiers de 18 à 120 ans"""
+    q = [taux_mortalite_etendu(age) for age in range(AGE_MIN, AGE_LIMITE + 1)]
+    survie = [1.0]
+    for taux in q[:-1]:
+        survie.append(survie[-1] * (1 - taux))
+    return q, survie
+
+
+VECTEUR_Q, VECTEUR_SURVIE = _construire_vecteurs_mortalite()
+
+
+@lru_cache(maxsize=128)
+def get_commutations(taux):
+    """Colonnes de commutation pour un taux d'intérêt (en %).
+
+    Les colonnes sont indexées par (âge - 18) et actualisées depuis 18 ans :
+    D = v^i l, C = v^(i+1) d, N et M leurs sommes cumulées jusqu'à 119 ans,
+    S la somme cumulée des q actualisés (utilisée par le décès temporaire).
+    """
+    v = 1 / (1 + taux / 100)
+    n = len(VECTEUR_Q)
+    D = [0.0] * n
+    C = [0.0] * n
+    Q = [0.0] * n
+    facteur = 1.0
+    for i in range(n):
+        D[i] = VECTEUR_SURVIE[i] * facteur
+        facteur *= v
+        C[i] = VECTEUR_SURVIE[i] * VECTEUR_Q[i] * facteur
+        Q[i] = VECTEUR_Q[i] * facteur
+
+    # Sommes cumulées à rebours, nulles à 120 ans
+    N = [0.0] * n
+    M = [0.0] * n
+    S = [0.0] * n
+    for i in range(n - 2, -1, -1):
+        N[i] = N[i + 1] + D[i]
+        M[i] = M[i + 1] + C[i]
+        S[i] = S[i + 1] + Q[i]
+
+    return {'D': D, 'N': N, 'C': C, 'M': M, 'S': S, 'v': v}
+
+
+def prime_deces_temporaire(capital, age, duree, taux, facteur_risque):
+    """Prime décès temporaire à partir des tables de commutation (âge entier)"""
+    table = get_commutations(taux)
+    i = int(age) - AGE_MIN
+    fin = min(i + int(duree), len(VECTEUR_Q) - 1)
+    valeur = (table['S'][i] - table['S'][fin]) / table['v'] ** i
+    return capital * valeur * facteur_risque * TARIFS['vie']['chargements']['deces']
+
+
+def prime_vie_entiere(capital, age, taux, facteur_risque):
+    """Prime vie entière : A_x = M_x / D_x"""
+    table = get_commutations(taux)
+    i = int(age) - AGE_MIN
+    valeur = table['M'][i] / table['D'][i]
+    return capital * valeur * facteur_risque * TARIFS['vie']['chargements']['vie_entiere']
+
+
+def prime_rente_viagere(capital, age, taux, facteur_risque):
+    """Prime rente viagère : v * N_x / D_x par unité de rente annuelle"""
+    table = get_commutations(taux)
+    i = int(age) - AGE_MIN
+    valeur = table['v'] * table['N'][i] / table['D'][i]
+    rente_annuelle = capital * TARIFS['vie']['taux_rente']
+    return rente_annuelle * valeur * facteur_risque * TARIFS['vie']['chargements']['rente']
+
+
+def primes_vie(capitaux, ages, durees, taux, type_contrat, facteur_risque):
+    """Primes annuelles sur une tête pour des tableaux de capitaux, âges et durées.
+
+    Mêmes formules que prime_deces_temporaire, prime_vie_entiere et
+    prime_rente_viagere, évaluées pour tous les candidats à la fois.
+    """
+    table = get_commutations(taux)
+    i = np.asarray(ages, dtype=int) - AGE_MIN
+    if type_contrat == 'deces':
+        S = np.asarray(table['S'])
+        fin = np.minimum(i + np.asarray(durees, dtype=int), len(VECTEUR_Q) - 1)
+        valeur = (S[i] - S[fin]) / table['v'] ** i
+    elif type_contrat == 'vie_entiere':
+        valeur = np.asarray(table['M'])[i] / np.asarray(table['D'])[i]
+    elif type_contrat == 'rente':
+        valeur = table['v'] * np.asarray(table['N'])[i] / np.asarray(table['D'])[i] * TARIFS['vie']['taux_rente']
+    else:
+        raise ValueError('Type de contrat non reconnu')
+    return np.asarray(capitaux, dtype=float) * valeur * facteur_risque * TARIFS['vie']['chargements'][type_contrat]
+
+
+def precharger_tables(taux_min=0.1, taux_max=5.0, pas=0.1):
+    """Précalcule les commutations pour tous les taux proposés par le formulaire.
+
+    Appelé dans le processus maître avant le fork des workers : les tables
+    sont alors partagées en copie sur écriture au lieu d'être recalculées
+    dans chaque worker.
+    """
+    nombre = int(round((taux_max - taux_min) / pas)) + 1
+    for k in range(nombre):
+        get_commutations(round(taux_min + k * pas, 1))
+    get_bundle()
+    return nombre
+
+
+def _serialiser(contenu):
+    return json.dumps(contenu, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+@lru_cache(maxsize=1)
+def get_bundle():
+    """Paquet versionné des tables et tarifs pour le navigateur.
+
+    Retourne (version, json, json_gzip). La version est l'empreinte du
+    contenu : elle change dès qu'une table ou un facteur change.
+    """
+    commutations = get_commutations(TAUX_TECHNIQUE_DEFAUT)
+    contenu = {
+        'age_min': AGE_MIN,
+        'age_limite': AGE_LIMITE,
+        'q': VECTEUR_Q,
+        'survie': VECTEUR_SURVIE,
+        'tarifs': TARIFS,
+        'commutations': {
+            str(TAUX_TECHNIQUE_DEFAUT): {col: commutations[col] for col in ('D', 'N', 'C', 'M', 'S')}
+        }
+    }
+    version = hashlib.sha256(_serialiser(contenu)).hexdigest()[:12]
+    contenu['version'] = version
+    donnees = _serialiser(contenu)
+    return version, donnees, gzip.compress(donnees, mtime=0)
+
+
+def get_tariff_version():
+    """Version courante des tables et facteurs de tarification"""
+    return get_bundle()[0]
+
+
+def _aplatir(tarifs, prefixe=''):
+    """{'vie': {'taux_rente': 0.08}} -> {'vie.taux_rente': 0.08}"""
+    valeurs = {}
+    for cle, valeur in tarifs.items():
+        if isinstance(valeur, dict):
+            valeurs.update(_aplatir(valeur, f'{prefixe}{cle}.'))
+        else:
+            valeurs[f'{prefixe}{cle}'] = valeur
+    return valeurs
+
+
+def get_empreintes():
+    """Empreinte de chaque composante du tarif (table de mortalité et chaque facteur).
+
+    La comparaison des empreintes de deux versions donne les composantes
+    modifiées, et donc les calculs à refaire.
+    """
+    empreintes = {cle: repr(valeur) for cle, valeur in _aplatir(TARIFS).items()}
+    empreintes['mortalite'] = hashlib.sha256(_serialiser(VECTEUR_Q)).hexdigest()[:12]
+    return empreintes
@@ -0,0 +1,421 @@
+import cProfile
+import functools
+import glob
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows : un seul processus, le verrou de threads suffit
+    fcntl = None
+
+
+def _tranche_age(age):
+    dizaine = int(float(age)) // 10 * 10
+    return f'{dizaine}-{dizaine + 9}'
+
+
+def _tranche_duree(duree):
+    debut = max(0, int(float(duree)) - 1) // 5 * 5 + 1
+    return f'{debut}-{debut + 4}'
+
+
+def formes_arguments(arguments):
+    """Âge, durée et type de contrat d'un appel, par tranches.
+
+    Reconnaît les signatures du calculateur : arguments nommés (age, duree,
+    term), dictionnaire de formulaire (params) ou instance de PremiumCalculator.
+    """
+    sources = [arguments]
+    if isinstance(arguments.get('params'), dict):
+        sources.append(arguments['params'])
+    if 'self' in arguments:
+        sources.append(vars(arguments['self']))
+
+    formes = {}
+    for source in sources:
+        try:
+            if 'age' in source and 'age' not in formes:
+                formes['age'] = _tranche_age(source['age'])
+            for cle in ('duree', 'term'):
+                if source.get(cle) not in (None, '') and 'duree' not in formes:
+                    formes['duree'] = _tranche_duree(source[cle])
+        except (TypeError, ValueError):
+            continue
+        for cle in ('coverageType', 'coverage_type'):
+            if source.get(cle) and 'type' not in formes:
+                formes['type'] = str(source[cle])
+    return formes
+
+
+class Profileur:
+    """Instrumentation des fonctions de tarification.
+
+    Les fonctions enregistrées ne sont remplacées par une enveloppe
+    mesurée que pendant activer() : désactivé, le code d'origine est
+    appelé directement, sans aucun surcoût.
+    Les temps sont inclusifs (une fonction compte le temps de celles qu'elle appelle).
+
+    Avec un `dossier`, l'état (actif, génération des statistiques) est
+    partagé par tous les processus dans etat.json : chacun l'applique dans
+    synchroniser(), et publie ses statistiques dans son propre fichier,
+    que rapport() additionne. À sa sortie (retirer(), ou détecté par
+    rapport() s'il a été tué), un processus verse ses statistiques dans
+    termines.json et son fichier disparaît.
+    """
+
+    def __init__(self, dossier=None):
+        self.actif = False
+        self.points = []
+        self.stats = {}
+        self.dossier = dossier
+        self.generation = 0
+        self._originaux = {}
+        self._verrou = threading.Lock()
+        self._etat_applique = None
+        self._pid = None
+        self._fichier_stats = None
+        self._modifie = False
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+
+    def enregistrer(self, conteneur, noms, prefixe=''):
+        """Ajoute des fonctions à instrumenter : attributs d'une classe ou clés d'un dict.
+
+        Les statistiques sont regroupées sous prefixe + nom de la fonction,
+        quelle que soit la référence par laquelle elle est appelée.
+        """
+        for nom in noms:
+            self.points.append((conteneur, nom, prefixe))
+
+    @staticmethod
+    def _lire(conteneur, nom):
+        return conteneur[nom] if isinstance(conteneur, dict) else conteneur.__dict__[nom]
+
+    @staticmethod
+    def _ecrire(conteneur, nom, valeur):
+        if isinstance(conteneur, dict):
+            conteneur[nom] = valeur
+        else:
+            setattr(conteneur, nom, valeur)
+
+    def activer(self):
+        """Active le profilage (dans tous les processus si l'état est partagé)"""
+        self._changer_etat(actif=True)
+
+    def desactiver(self):
+        self._changer_etat(actif=False)
+
+    def reinitialiser(self):
+        """Efface les statistiques (de tous les processus si l'état est partagé)"""
+        if not self.dossier:
+            with self._verrou:
+                self.stats = {}
+            return
+        with self._verrou_fichiers():
+            etat = self._lire_etat()
+            etat['generation'] += 1
+            for chemin in glob.glob(os.path.join(self.dossier, 'stats-*.json')) + [self._chemin_termines()]:
+                if os.path.exists(chemin):
+                    os.remove(chemin)
+            self._ecrire_etat(etat)
+        self.synchroniser()
+
+    def _changer_etat(self, actif):
+        if not self.dossier:
+            self._appliquer(actif)
+            return
+        etat = self._lire_etat()
+        etat['actif'] = actif
+        self._ecrire_etat(etat)
+        self.synchroniser()
+
+    def _appliquer(self, actif):
+        with self._verrou:
+            if self.actif == actif:
+                return
+            if actif:
+                for index, (conteneur, nom, prefixe) in enumerate(self.points):
+                    original = self._lire(conteneur, nom)
+                    self._originaux[index] = original
+                    self._ecrire(conteneur, nom, self._envelopper(original, prefixe + original.__name__))
+            else:
+                for index, (conteneur, nom, _) in enumerate(self.points):
+                    self._ecrire(conteneur, nom, self._originaux.pop(index))
+            self.actif = actif
+        if actif:
+            print(f"🔬 Profilage activé ({len(self.points)} fonctions, pid {os.getpid()})")
+        else:
+            print(f"🔬 Profilage désactivé (pid {os.getpid()})")
+
+    # ===== État partagé entre processus =====
+    def _chemin_etat(self):
+        return os.path.join(self.dossier, 'etat.json')
+
+    def _lire_etat(self):
+        try:
+            with open(self._chemin_etat(), encoding='utf-8') as fichier:
+                return json.load(fichier)
+        except (OSError, ValueError):
+            return {'actif': False, 'generation': 0}
+
+    def _ecrire_etat(self, etat):
+        temporaire = f'{self._chemin_etat()}.{os.getpid()}.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            json.dump(etat, fichier)
+        os.replace(temporaire, self._chemin_etat())
+
+    def synchroniser(self):
+        """Applique l'état partagé s'il a changé (un os.stat par appel sinon)"""
+        if not self.dossier:
+            return
+        if self._pid != os.getpid():
+            # Nouveau processus (fork d'un worker) : son propre fichier de statistiques
+            self._pid = os.getpid()
+            self._fichier_stats = os.path.join(self.dossier, f'stats-{self._pid}-{time.time_ns()}.json')
+        try:
+            infos = os.stat(self._chemin_etat())
+        except FileNotFoundError:
+            return
+        signature = (infos.st_ino, infos.st_mtime_ns, infos.st_size)
+        if signature == self._etat_applique:
+            return
+        self._etat_applique = signature
+
+        etat = self._lire_etat()
+        if etat['generation'] != self.generation:
+            with self._verrou:
+                self.stats = {}
+                self.generation = etat['generation']
+                self._modifie = False
+        self._appliquer(etat['actif'])
+
+    def publier(self):
+        """Écrit les statistiques de ce processus si elles ont changé depuis la dernière fois"""
+        if not self.dossier or not self._modifie:
+            return
+        self.synchroniser()
+        with self._verrou:
+            contenu = {'generation': self.generation, 'pid': self._pid, 'stats': self.stats}
+            texte = json.dumps(contenu)
+            self._modifie = False
+        temporaire = self._fichier_stats + '.tmp'
+        with open(temporaire, 'w', encoding='utf-8') as fichier:
+            fichier.write(texte)
+        os.replace(temporaire, self._fichier_stats)
+
+    def _envelopper(self, fonction, libelle):
+        signature = inspect.signature(fonction)
+
+        @functools.wraps(fonction)
+        def enveloppe(*args, **kwargs):
+            debut = time.perf_counter()
+            try:
+                return fonction(*args, **kwargs)
+            finally:
+                ecoule = time.perf_counter() - debut
+                try:
+                    formes = formes_arguments(signature.bind_partial(*args, **kwargs).arguments)
+                except TypeError:
+                    formes = {}
+                self._enregistrer_appel(libelle, ecoule, formes)
+
+        return enveloppe
+
+    def _enregistrer_appel(self, libelle, ecoule, formes):
+        with self._verrou:
+            stats = self.stats.get(libelle)
+            if stats is None:
+                stats = self.stats[libelle] = {
+                    'appels': 0, 'temps_total': 0.0, 'temps_max': 0.0,
+                    'age': Counter(), 'duree': Counter(), 'type': Counter()
+                }
+            stats['appels'] += 1
+            stats['temps_total'] += ecoule
+            stats['temps_max'] = max(stats['temps_max'], ecoule)
+            for cle, valeur in formes.items():
+                stats[cle][valeur] += 1
+            self._modifie = True
+
+    def _chemin_termines(self):
+        return os.path.join(self.dossier, 'termines.json')
+
+    @contextmanager
+    def _verrou_fichiers(self):
+        """Exclusion entre processus pour termines.json et la réinitialisation"""
+        with open(os.path.join(self.dossier, 'verrou'), 'a') as fichier:
+            if fcntl is not None:
+                fcntl.flock(fichier.fileno(), fcntl.LOCK_EX)
+            yield
+
+    @staticmethod
+    def _lire_json(chemin):
+        try:
+            with open(chemin, encoding='utf-8') as fichier:
+                return json.load(fichier)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _cumuler(total, stats_par_fonction):
+        for libelle, stats in stats_par_fonction.items():
+            cumul = total.setdefault(libelle, {
+                'appels': 0, 'temps_total': 0.0, 'temps_max': 0.0,
+                'age': Counter(), 'duree': Counter(), 'type': Counter()
+            })
+            cumul['appels'] += stats['appels']
+            cumul['temps_total'] += stats['temps_total']
+            cumul['temps_max'] = max(cumul['temps_max'], stats['temps_max'])
+            for cle in ('age', 'duree', 'type'):
+                cumul[cle].update(stats[cle])
+
+    def _verser(self, chemin):
+        """Ajoute le fichier d'un processus terminé à termines.json, puis le supprime"""
+        with self._verrou_fichiers():
+            contenu = self._lire_json(chemin)
+            generation = self._lire_etat()['generation']
+            if contenu is not None and contenu['generation'] == generation:
+                termines = self._lire_json(self._chemin_termines())
+                if termines is None or termines['generation'] != generation:
+                    termines = {'generation': generation, 'processus': 0, 'stats': {}}
+                cumul = {}
+                self._cumuler(cumul, termines['stats'])
+                self._cumuler(cumul, contenu['stats'])
+                termines['stats'] = cumul
+                termines['processus'] += 1
+                temporaire = f'{self._chemin_termines()}.{os.getpid()}.tmp'
+                with open(temporaire, 'w', encoding='utf-8') as fichier:
+                    json.dump(termines, fichier)
+                os.replace(temporaire, self._chemin_termines())
+            if os.path.exists(chemin):
+                os.remove(chemin)
+
+    def retirer(self):
+        """À la sortie d'un processus (worker_exit) : ses statistiques rejoignent termines.json"""
+        if not self.dossier or self._fichier_stats is None:
+            return
+        self.publier()
+        if os.path.exists(self._fichier_stats):
+            self._verser(self._fichier_stats)
+
+    @staticmethod
+    def _processus_vivant(pid):
+        if os.name != 'posix':
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _stats_tous_processus(self):
+        """Statistiques de la génération courante : (cumul, processus actifs, processus terminés)"""
+        self.publier()
+        generation = self._lire_etat()['generation']
+        total, actifs = {}, 0
+        for chemin in glob.glob(os.path.join(self.dossier, 'stats-*.json')):
+            contenu = self._lire_json(chemin)
+            if contenu is None or contenu['generation'] != generation:
+                continue
+            if not self._processus_vivant(contenu['pid']):
+                # Worker tué sans passer par retirer()
+                self._verser(chemin)
+                continue
+            actifs += 1
+            self._cumuler(total, contenu['stats'])
+
+        termines = self._lire_json(self._chemin_termines())
+        if termines is None or termines['generation'] != generation:
+            return total, actifs, 0
+        self._cumuler(total, termines['stats'])
+        return total, actifs, termines['processus']
+
+    def rapport(self):
+        """Statistiques par fonction, de la plus coûteuse à la moins coûteuse.
+
+        Avec un état partagé : somme des statistiques publiées par les
+        processus actifs (chacun publie à la fin de chaque requête) et par
+        les processus terminés depuis la dernière réinitialisation.
+        """
+        if self.dossier:
+            toutes, processus, termines = self._stats_tous_processus()
+            lignes = self._lignes(toutes)
+        else:
+            with self._verrou:
+                lignes, processus, termines = self._lignes(self.stats), 1, 0
+        lignes.sort(key=lambda ligne: ligne['temps_total_ms'], reverse=True)
+        return {'actif': self.actif, 'processus': processus, 'processus_termines': termines, 'fonctions': lignes}
+
+    @staticmethod
+    def _lignes(toutes):
+        return [{
+            'fonction': libelle,
+            'appels': stats['appels'],
+            'temps_total_ms': stats['temps_total'] * 1000,
+            'temps_moyen_ms': stats['temps_total'] * 1000 / stats['appels'],
+            'temps_max_ms': stats['temps_max'] * 1000,
+            'age': dict(stats['age'].most_common()),
+            'duree': dict(stats['duree'].most_common()),
+            'type': dict(stats['type'].most_common())
+        } for libelle, stats in toutes.items()]
+
+
+class ProfilRequete:
+    """Profil d'une seule requête, écrit dans un fichier.
+
+    'cprofile' produit un fichier .prof (pstats, snakeviz) ; 'pile'
+    échantillonne la pile du thread de la requête et produit un fichier
+    .folded (format replié de flamegraph.pl / speedscope).
+    """
+
+    MODES = ('cprofile', 'pile')
+
+    def __init__(self, mode, dossier, nom, intervalle=0.001):
+        if mode not in self.MODES:
+            raise ValueError(f'Mode de profil inconnu: {mode}')
+        self.mode = mode
+        self.chemin = os.path.join(dossier, f"{nom}.{'prof' if mode == 'cprofile' else 'folded'}")
+        self.intervalle = intervalle
+        os.makedirs(dossier, exist_ok=True)
+
+    def demarrer(self):
+        if self.mode == 'cprofile':
+            self._profil = cProfile.Profile()
+            self._profil.enable()
+        else:
+            self._piles = Counter()
+            self._arret = threading.Event()
+            self._echantillonneur = threading.Thread(
+                target=self._echantillonner, args=(threading.get_ident(),), daemon=True)
+            self._echantillonneur.start()
+
+    def arreter(self):
+        if self.mode == 'cprofile':
+            self._profil.disable()
+            self._profil.dump_stats(self.chemin)
+        else:
+            self._arret.set()
+            self._echantillonneur.join()
+            with open(self.chemin, 'w', encoding='utf-8') as fichier:
+                for pile, nombre in self._piles.most_common():
+                    fichier.write(f'{pile} {nombre}\n')
+        return self.chemin
+
+    def _echantillonner(self, thread_id):
+        while not self._arret.wait(self.intervalle):
+            frame = sys._current_frames().get(thread_id)
+            cadres = []
+            while frame is not None:
+                code = frame.f_code
+                cadres.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if cadres:
+                self._piles[';'.join(reversed(cadres))] += 1
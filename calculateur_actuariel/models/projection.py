@@ -0,0 +1,158 @@
+import numpy as np
+
+from .pricing_tables import AGE_MIN, AGE_LIMITE, VECTEUR_Q, TARIFS
+from . import joint_life
+
+
+# Taux annuels de chute (sortie sans valeur) et de rachat (sortie avec valeur)
+# par année de contrat ; la dernière valeur s'applique aux années suivantes
+TABLES_RESILIATION = {
+    'deces': {
+        'chute': [0.12, 0.09, 0.07, 0.06, 0.05, 0.04],
+        'rachat': [0.0]
+    },
+    'vie_entiere': {
+        'chute': [0.05, 0.04, 0.03, 0.02],
+        'rachat': [0.0, 0.02, 0.03, 0.04, 0.05, 0.05, 0.05, 0.05, 0.04]
+    },
+    'rente': {
+        'chute': [0.0],
+        'rachat': [0.0]
+    }
+}
+
+# Valeur de rachat en pourcentage du capital : 3% par année écoulée, plafonnée à 90%
+VALEUR_RACHAT_PAR_AN = 0.03
+VALEUR_RACHAT_MAX = 0.9
+
+_Q = np.asarray(VECTEUR_Q)
+
+
+def _table_par_duree(valeurs, horizon):
+    """Étend une table par durée sur l'horizon de projection"""
+    table = np.full(horizon, valeurs[-1], dtype=float)
+    n = min(len(valeurs), horizon)
+    table[:n] = valeurs[:n]
+    return table
+
+
+def projeter(ages, durees, capitaux, types, taux, facteurs_risque=None, ages_second=None, statuts=None):
+    """Projection multi-décréments (décès, chute, rachat) d'un portefeuille.
+
+    Chaque argument est un tableau (ou un scalaire pour taux) d'une valeur
+    par contrat. Toutes les grandeurs sont calculées d'un bloc sur une
+    matrice contrats x années : les décès surviennent en cours d'année,
+    les chutes et rachats en fin d'année parmi les survivants.
+
+    Pour les contrats à deux têtes, ages_second et statuts donnent l'âge
+    du second assuré et le statut (voir joint_life.STATUTS) ; une chaîne
+    vide désigne un contrat sur une tête.
+    """
+    ages = np.atleast_1d(np.asarray(ages, dtype=int))
+    durees = np.atleast_1d(np.asarray(durees, dtype=int))
+    capitaux = np.atleast_1d(np.asarray(capitaux, dtype=float))
+    types = np.atleast_1d(np.asarray(types))
+    nombre = len(ages)
+    taux = np.broadcast_to(np.asarray(taux, dtype=float), (nombre,))
+    if facteurs_risque is None:
+        facteurs_risque = np.ones(nombre)
+    facteurs_risque = np.broadcast_to(np.asarray(facteurs_risque, dtype=float), (nombre,))
+
+    inconnus = set(types.tolist()) - set(TABLES_RESILIATION)
+    if inconnus:
+        raise ValueError(f'Type de contrat non reconnu: {", ".join(sorted(inconnus))}')
+
+    if statuts is None:
+        statuts = np.full(nombre, '')
+    statuts = np.atleast_1d(np.asarray(statuts))
+    deux_tetes = statuts != ''
+    if ages_second is None:
+        ages_second = ages
+    ages_second = np.atleast_1d(np.asarray(ages_second, dtype=int))
+
+    # Vie entière et rente courent jusqu'à 120 ans (selon le statut pour deux têtes)
+    limite = AGE_LIMITE - ages
+    if deux_tetes.any():
+        limite[deux_tetes] = joint_life.horizon_statut(ages[deux_tetes], ages_second[deux_tetes],
+                                                       statuts[deux_tetes])
+    durees = np.where(types == 'deces', np.minimum(durees, limite), limite)
+    horizon = int(durees.max())
+    t = np.arange(horizon)
+    actif = t[None, :] < durees[:, None]
+
+    # Mortalité par âge atteint, ou mortalité équivalente du statut à deux têtes
+    indices = np.minimum(ages[:, None] - AGE_MIN + t[None, :], len(_Q) - 1)
+    q = _Q[indices]
+    if deux_tetes.any():
+        survie = joint_life.survie_statut(ages[deux_tetes], ages_second[deux_tetes],
+                                          statuts[deux_tetes])[:, :horizon + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            q[deux_tetes] = np.where(survie[:, :-1] > 0, 1 - survie[:, 1:] / survie[:, :-1], 1.0)
+    q = np.minimum(q * facteurs_risque[:, None], 1.0) * actif
+
+    chute = np.zeros((nombre, horizon))
+    rachat = np.zeros((nombre, horizon))
+    for type_contrat, table in TABLES_RESILIATION.items():
+        lignes = types == type_contrat
+        if lignes.any():
+            chute[lignes] = _table_par_duree(table['chute'], horizon)
+            rachat[lignes] = _table_par_duree(table['rachat'], horizon)
+    chute *= actif
+    rachat *= actif
+
+    en_vigueur = np.ones((nombre, horizon + 1))
+    en_vigueur[:, 1:] = np.cumprod((1 - q) * (1 - chute - rachat), axis=1)
+    # Les contrats arrivés à échéance sortent du portefeuille
+    en_vigueur *= np.arange(horizon + 1)[None, :] < durees[:, None]
+    debut = en_vigueur[:, :-1]
+    deces = debut * q
+    chutes = debut * (1 - q) * chute
+    rachats = debut * (1 - q) * rachat
+
+    est_rente = (types == 'rente')[:, None]
+    valeur_rachat = np.minimum(VALEUR_RACHAT_PAR_AN * (t + 1), VALEUR_RACHAT_MAX)
+    prestations_deces = np.where(est_rente, 0.0, deces * capitaux[:, None])
+    valeurs_rachat = rachats * valeur_rachat[None, :] * capitaux[:, None]
+    rentes = np.where(est_rente, debut * TARIFS['vie']['taux_rente'] * capitaux[:, None], 0.0)
+
+    # Flux payés en fin d'année, primes encaissées en début d'année
+    v = 1 / (1 + taux[:, None] / 100)
+    actualisation = v ** (t[None, :] + 1)
+    va_prestations = ((prestations_deces + valeurs_rachat + rentes) * actualisation).sum(axis=1)
+    annuite = (debut * actualisation / v).sum(axis=1)
+
+    chargements = np.array([TARIFS['vie']['chargements'][type_contrat] for type_contrat in types.tolist()])
+    prime_unique = va_prestations * chargements
+    # Une rente est financée par prime unique, les autres contrats par primes annuelles nivelées
+    prime_annuelle = np.where(est_rente[:, 0], prime_unique, prime_unique / annuite)
+
+    return {
+        'en_vigueur': en_vigueur,
+        'deces': deces,
+        'chutes': chutes,
+        'rachats': rachats,
+        'prestations_deces': prestations_deces,
+        'valeurs_rachat': valeurs_rachat,
+        'rentes': rentes,
+        'actualisation': actualisation,
+        'va_prestations': va_prestations,
+        'annuite': annuite,
+        'prime_unique': prime_unique,
+        'prime_annuelle': prime_annuelle
+    }
+
+
+def projeter_contrat(capital, age, duree, taux, type_contrat, facteur_risque=1.0):
+    """Projection d'un seul contrat (portefeuille d'une ligne)"""
+    projection = projeter([age], [duree], [capital], [type_contrat], taux, [facteur_risque])
+    return {cle: valeur[0] for cle, valeur in projection.items()}
+
+
+def flux_agreges(projection):
+    """Flux annuels du portefeuille (somme sur les contrats)"""
+    return {
+        'en_vigueur': projection['en_vigueur'][:, :-1].sum(axis=0),
+        'prestations_deces': projection['prestations_deces'].sum(axis=0),
+        'valeurs_rachat': projection['valeurs_rachat'].sum(axis=0),
+        'rentes': projection['rentes'].sum(axis=0)
+    }
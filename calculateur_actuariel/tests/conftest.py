@@ -0,0 +1,10 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# L'application importée par les tests travaille dans un dossier temporaire,
+# jamais sur la base de instance/
+if 'CALCULATEUR_INSTANCE' not in os.environ:
+    os.environ['CALCULATEUR_INSTANCE'] = tempfile.mkdtemp(prefix='calculateur-tests-')
+    atexit.register(shutil.rmtree, os.environ['CALCULATEUR_INSTANCE'], ignore_errors=True)
@@ -0,0 +1,32 @@
+"""Recherche inverse : plus grande valeur dont la prime ne dépasse pas la cible."""
+import numpy as np
+
+from models.goal_seek import resoudre_continu, resoudre_discret
+
+
+def test_discret_croissant():
+    valeurs = np.arange(5, 41)
+    assert resoudre_discret(lambda x: 10.0 * x, 200, valeurs) == (20, 200.0, (5, 20))
+
+
+def test_discret_egalites_au_plancher():
+    # Prime minimale de 5 UM jusqu'à 12 ans, croissante ensuite
+    valeurs = np.arange(5, 41)
+    evaluer = lambda x: np.maximum(5.0, np.asarray(x, dtype=float) - 7)
+    assert resoudre_discret(evaluer, 5, valeurs) == (12, 5.0, (5, 12))
+
+
+def test_discret_decroissant():
+    # Rente : la prime baisse avec l'âge, tous les âges à partir de 60 conviennent
+    valeurs = np.arange(18, 81)
+    evaluer = lambda x: 1000.0 - 10 * np.asarray(x, dtype=float)
+    assert resoudre_discret(evaluer, 400, valeurs) == (80, 200.0, (60, 80))
+
+
+def test_discret_aucune_valeur():
+    assert resoudre_discret(lambda x: np.full(len(x), 10.0), 5, np.arange(5, 41)) is None
+
+
+def test_continu():
+    capital, _ = resoudre_continu(lambda x: np.asarray(x) * 0.001, 50, 1000, 1e8)
+    assert abs(capital - 50000) <= 0.01
@@ -0,0 +1,32 @@
+"""Cohérence des contrats à deux têtes avec les contrats sur une tête."""
+import pytest
+
+from models import joint_life, pricing_tables
+
+
+AGES = (18, 30, 45, 60, 70, 80)
+
+
+def prime_une_tete(type_contrat, age, duree, taux):
+    if type_contrat == 'deces':
+        return pricing_tables.prime_deces_temporaire(100000, age, duree, taux, 1.0)
+    return pricing_tables.prime_vie_entiere(100000, age, taux, 1.0)
+
+
+@pytest.mark.parametrize('type_contrat', ('deces', 'vie_entiere'))
+@pytest.mark.parametrize('age1', AGES)
+@pytest.mark.parametrize('age2', AGES)
+@pytest.mark.parametrize('duree', (5, 20, 40))
+@pytest.mark.parametrize('taux', (0.5, 1.5, 4.0))
+def test_encadrement_par_les_primes_une_tete(type_contrat, age1, age2, duree, taux):
+    if type_contrat == 'vie_entiere':
+        duree = 120 - age1
+    une_tete = [prime_une_tete(type_contrat, age, duree, taux) for age in (age1, age2)]
+    premier_deces, dernier_survivant = (
+        joint_life.prime_deux_tetes(100000, age1, age2, duree, taux, type_contrat, statut, 1.0)
+        for statut in joint_life.STATUTS)
+
+    # Le premier décès survient au plus tard, le dernier au plus tôt, avec chaque tête
+    assert premier_deces >= max(une_tete) * (1 - 1e-12)
+    assert dernier_survivant <= min(une_tete) * (1 + 1e-12)
+
@@ -0,0 +1,48 @@
+"""Parité des noyaux Numba avec le code Python d'origine.
+
+Les primes passent par les vrais points d'entrée (app.py, PremiumCalculator)
+avec le backend 'python', puis avec le backend 'numba'.
+"""
+import pytest
+
+pytest.importorskip('numba')
+
+import app
+from models import PremiumCalculator, kernels
+
+
+AGES_ENTIERS = (18, 25, 40, 55, 70, 80)
+DUREES = (1, 5, 10, 20, 40)
+
+
+@pytest.fixture
+def backends():
+    """Calcule une fonction avec chaque backend et rétablit le backend d'origine"""
+    initial = kernels.backend
+
+    def calculer(fonction):
+        kernels.selectionner_backend('python')
+        attendu = fonction()
+        assert kernels.selectionner_backend('numba') == 'numba'
+        return attendu, fonction()
+
+    yield calculer
+    kernels.selectionner_backend(initial)
+
+
+@pytest.mark.parametrize('age', (18.5, 30.25, 47.5, 63.75, 79.5))
+@pytest.mark.parametrize('duree', DUREES)
+@pytest.mark.parametrize('taux', (0.1, 1.5, 5.0))
+def test_deces_temporaire_age_non_entier(backends, age, duree, taux):
+    attendu, obtenu = backends(lambda: app.calculate_prime_deces_temporaire(100000, age, duree, taux, 1.3))
+    assert obtenu == pytest.approx(attendu, rel=1e-12)
+
+
+@pytest.mark.parametrize('gender', ('male', 'female'))
+@pytest.mark.parametrize('age', AGES_ENTIERS)
+@pytest.mark.parametrize('duree', DUREES)
+def test_premium_calculator(backends, gender, age, duree):
+    calculateur = PremiumCalculator(age, gender, 'life', 'vie', 100000, duree, 'non_smoker', ['none'])
+    methodes = ('calculate_life_insurance', 'calculate_annuity_premium', 'calculate_annuity_factor')
+    attendu, obtenu = backends(lambda: [getattr(calculateur, nom)() for nom in methodes])
+    assert obtenu == pytest.approx(attendu, rel=1e-12)
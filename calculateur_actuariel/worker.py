@@ -0,0 +1,44 @@
+# Workers de la file de tâches longues : python worker.py --workers 4
+#
+# Chaque worker est un processus qui réclame les tâches en attente dans la
+# table jobs. Les tâches interrompues (arrêt, redémarrage) sont relancées.
+import argparse
+import multiprocessing
+import os
+import signal
+import socket
+
+
+def _executer_worker(numero):
+    from app import job_queue
+
+    arret = multiprocessing.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: arret.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: arret.set())
+    job_queue.boucle_worker(f'{socket.gethostname()}-{os.getpid()}-{numero}', arret=arret.is_set)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Workers de la file de tâches actuarielles')
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('CALCULATEUR_JOB_WORKERS', multiprocessing.cpu_count())))
+    args = parser.parse_args()
+
+    processus = [multiprocessing.Process(target=_executer_worker, args=(numero,))
+                 for numero in range(args.workers)]
+    for p in processus:
+        p.start()
+
+    # Les workers terminent leur tâche en cours avant de s'arrêter
+    def arreter(signum, frame):
+        for p in processus:
+            p.terminate()
+
+    signal.signal(signal.SIGTERM, arreter)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for p in processus:
+        p.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+# Point d'entrée WSGI pour la production (voir gunicorn.conf.py)
+from app import app, precharger_gabarits
+from models import pricing_tables
+
+# Tables de mortalité, commutations et tarifs chargés une fois dans le maître
+pricing_tables.precharger_tables()
+# Gabarits Jinja compilés avant le fork, partagés par les workers
+precharger_gabarits()
+
+application = app